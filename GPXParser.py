@@ -1,13 +1,51 @@
 #!/usr/bin/env python
-import os, re
+import os, re, sys
+import array, mmap, struct
+import xml.etree.ElementTree as ET
  
+class GPXSegment:
+   # track segment stored as two packed arrays of coordinates
+   # GPXWaypoint objects are only created when the wpts list is used
+   def __init__(self, lats=None, lons=None):
+      self.lats = lats if lats is not None else array.array("d")
+      self.lons = lons if lons is not None else array.array("d")
+      self._bbox_ = None
+
+   def __len__(self):
+      return len(self.lats)
+
+   def append(self, lat, lon):
+      self.lats.append(lat)
+      self.lons.append(lon)
+      self._bbox_ = None
+
+   def xy(self, i):
+      return (self.lats[i], self.lons[i])
+
+   @property
+   def wpts(self):
+      return [GPXWaypoint(lon, lat) for lat, lon in zip(self.lats, self.lons)]
+
+   def bbox(self, latMin=None, latMax=None, lonMin=None,lonMax=None):
+     if latMin == None:
+       if self._bbox_ is None:
+         if len(self.lats) > 0:
+           self._bbox_ = (min(self.lats), max(self.lats), min(self.lons), max(self.lons))
+         else:
+           self._bbox_ = (100.0, -100.0, 181.0, -181.0)
+       return self._bbox_
+     self._bbox_ = (latMin, latMax, lonMin, lonMax)
+
 class GPXTrack:
    def __init__(self):
       self.attribs = {}
-      self.wpts = []
-      self.segs = []
+      self.segs = [] # list of GPXSegment objects
       self._bbox_ = None
-      
+
+   @property
+   def wpts(self):
+      return [w for seg in self.segs for w in seg.wpts]
+
    def bbox(self, latMin=None, latMax=None, lonMin=None,lonMax=None):
      if latMin == None:
        return self._bbox_
@@ -30,21 +68,14 @@ class GPXTrack:
          self.attribs[a[0].strip()] = a[1].strip()    
  
       for seg in segs:
-         newSeg = GPXTrack()
+         newSeg = GPXSegment()
          index = seg.find("<trkpt", 0)
-         latMin, latMax = 100.0, -100.0
-         lonMin, lonMax = 181.0, -181.0
          while (index != -1):
             indexFin = seg.index(">",index)
             w = GPXWaypoint()
             w.from_string(seg[index:indexFin+1]) 
-            self.wpts.append(w)
-            newSeg.wpts.append(w)
-            x,y = w.xy()
-            latMin, latMax = min(x,latMin), max(x, latMax)
-            lonMin, lonMax = min(y,lonMin), max(y, lonMax)
+            newSeg.append(w.lat, w.lon)
             index = seg.find("<trkpt", indexFin)
-         newSeg.bbox(latMin,latMax,lonMin,lonMax)
          self.segs.append(newSeg)
  
    def __repr__(self):
@@ -61,7 +92,7 @@ class GPXWaypoint:
       self.lon, self.lat = lon, lat 
       self.attribs={}
    def from_string(self, c):
-      f = re.search("<(trk|w)pt(?P<opts>.*?)>(?P<content>.*?)", c, re.DOTALL+re.I)
+      f = re.search("<(trk|w)pt(?P<opts>.*?)>(?P<content>.*)", c, re.DOTALL+re.I)
       if not f: return 1
       c = re.compile(".*?=\".*?\"", re.DOTALL)
       opts = re.findall(re.compile(".*?=\".*?\"", re.DOTALL), f.group("opts"))
@@ -91,21 +122,181 @@ class GPXRoute:
    def __init__(self):
       self.wps = [] # list of GPXWaypoints    
       self.attribs = {}
-      pass    
- 
+      pass
+
+def localName(tag):
+   # "{namespace}name" -> "name"
+   return tag.rsplit("}", 1)[-1]
+
+def prefixedName(tag, prefixes):
+   # "{namespace}name" -> "prefix:name" as written in the file
+   if tag.startswith("{"):
+      uri, name = tag[1:].split("}", 1)
+      prefix = prefixes.get(uri, "")
+      if prefix:
+         return prefix+":"+name
+      return name
+   return tag
+
+def waypointFromElement(elem, prefixes):
+   w = GPXWaypoint()
+   if "lat" in elem.attrib: w.lat = float(elem.attrib["lat"])
+   if "lon" in elem.attrib: w.lon = float(elem.attrib["lon"])
+   for e in elem.iter():
+      if e is not elem and len(e) == 0:
+         w.attribs[prefixedName(e.tag, prefixes)] = (e.text or "").strip()
+   return w
+
+# compiled sidecar of the segments of a GPX file, read through a memory map
+# layout: header (key of the source file), path of the source file,
+#         table of segments (offset, count, bbox), packed coordinates (float64)
+segmentsMagic = b"GPXSEGS1"
+segmentsHeader = struct.Struct("=8s1s3xIqqI4x")
+segmentsEntry = struct.Struct("=qq4d")
+
+def segmentsFileName(filename):
+   return filename + ".seg"
+
+def segmentsKey(filename):
+   st = os.stat(filename)
+   return (os.path.abspath(filename).encode("utf8"), st.st_size, st.st_mtime_ns)
+
+def saveSegments(filename, segs):
+   path, size, mtime = segmentsKey(filename)
+   path += b"\0" * (-len(path) % 8)
+   offset = (segmentsHeader.size + len(path) + segmentsEntry.size * len(segs)) // 8
+   table = []
+   for seg in segs:
+      table.append(segmentsEntry.pack(offset, len(seg), *seg.bbox()))
+      offset += 2 * len(seg)
+   tmpName = segmentsFileName(filename) + ".tmp"
+   with open(tmpName, "wb") as f:
+      f.write(segmentsHeader.pack(segmentsMagic, sys.byteorder[0].encode(), len(path), size, mtime, len(segs)))
+      f.write(path)
+      f.write(b"".join(table))
+      for seg in segs:
+         array.array("d", seg.lats).tofile(f)
+         array.array("d", seg.lons).tofile(f)
+   os.replace(tmpName, segmentsFileName(filename))
+
+def loadSegments(filename):
+   # returns the list of segments, or None if there is no valid compiled file
+   try:
+      f = open(segmentsFileName(filename), "rb")
+   except IOError:
+      return None
+   with f:
+      try:
+         mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      except ValueError:
+         return None
+   if len(mm) < segmentsHeader.size or len(mm) % 8 != 0:
+      mm.close()
+      return None
+   magic, order, pathLength, size, mtime, nSegs = segmentsHeader.unpack_from(mm, 0)
+   path = mm[segmentsHeader.size:segmentsHeader.size+pathLength].rstrip(b"\0")
+   if magic != segmentsMagic or order != sys.byteorder[0].encode() or \
+      (path, size, mtime) != segmentsKey(filename):
+      mm.close()
+      return None
+   coords = memoryview(mm).cast("d")
+   segs = []
+   position = segmentsHeader.size + pathLength
+   for i in range(nSegs):
+      offset, count, latMin, latMax, lonMin, lonMax = segmentsEntry.unpack_from(mm, position)
+      position += segmentsEntry.size
+      seg = GPXSegment(coords[offset:offset+count], coords[offset+count:offset+2*count])
+      seg.bbox(latMin, latMax, lonMin, lonMax)
+      segs.append(seg)
+   return segs
+
 class GPXParser:
    #trcks  = [] # list of GPXTrack objects    
    #wpts = [] # list of GPXWp objects    
    #rts  = [] # list of GPXRoute objects    
-   def __init__(self, filename):    
+   def __init__(self, filename, materialize=True):    
       self.attribs={}
+      self.trcks, self.wpts, self.rts = [], [], []    
       if not filename.endswith(".gpx"):    
          print ("Warning: filename does not end on .gpx...")
       self.file = filename    
-      f = open(filename, "r",encoding="utf8")
-      content = f.read(); f.close()
-      self.init_from_string(content)
- 
+      if not materialize:
+         # items are read one at a time with stream()
+         return
+      for item in self.stream():
+         if isinstance(item, GPXWaypoint):
+            self.wpts.append(item)
+         else:
+            self.trcks.append(item)
+
+   def stream(self, accept=None, acceptWaypoint=None):
+      # event-driven parsing of the file: yields a GPXWaypoint for each <wpt>
+      # and a GPXTrack for each <trk> as soon as it is complete, the elements
+      # already processed are dropped so memory doesn't grow with the file size
+      # accept(element) can reject a <wpt> before the waypoint is built
+      # if the file is not well-formed XML, the items not read yet are taken from
+      # the regular expressions and acceptWaypoint(waypoint) replaces accept
+      nTrcks = 0
+      try:
+         for item in self.iterparse(accept):
+            if isinstance(item, GPXTrack):
+               nTrcks += 1
+            yield item
+      except ET.ParseError as msg:
+         # HTML entities, truncated file, ...
+         print ("Warning: XML parsing failed, using the regex parser...", msg)
+         f = open(self.file, "r",encoding="utf8")
+         content = f.read(); f.close()
+         rest = GPXParser(self.file, materialize=False)
+         rest.init_from_string(content)
+         for w in rest.wpts[self.nSeenWpts:]:
+            if acceptWaypoint is None or acceptWaypoint(w):
+               yield w
+         for t in rest.trcks[nTrcks:]:
+            yield t
+
+   def iterparse(self, accept=None):
+      # the <wpt> elements seen, accepted or not, are counted in nSeenWpts
+      self.nSeenWpts = 0
+      prefixes = {}
+      parents = []
+      trk = None
+      for event, elem in ET.iterparse(self.file, events=("start-ns", "start", "end")):
+         if event == "start-ns":
+            prefix, uri = elem
+            prefixes.setdefault(uri, prefix)
+            continue
+         tag = localName(elem.tag)
+         if event == "start":
+            parents.append(elem)
+            if tag == "trk":
+               trk = GPXTrack()
+            elif tag == "trkseg" and trk is not None:
+               trk.segs.append(GPXSegment())
+            continue
+         parents.pop()
+         if tag == "trkpt" and trk is not None:
+            trk.segs[-1].append(float(elem.attrib.get("lat", 0)), float(elem.attrib.get("lon", 0)))
+            del parents[-1][:]
+         elif tag == "trkseg" and trk is not None:
+            parents[-1].remove(elem)
+         elif tag == "wpt":
+            self.nSeenWpts += 1
+            if accept is None or accept(elem):
+               yield waypointFromElement(elem, prefixes)
+            if parents:
+               del parents[-1][:]
+         elif tag == "trk" and trk is not None:
+            for n, v in elem.attrib.items():
+               trk.attribs[n] = v
+            for child in elem:
+               if len(child) == 0:
+                  trk.attribs[prefixedName(child.tag, prefixes)] = (child.text or "").strip()
+            yield trk
+            trk = None
+            if parents:
+               del parents[-1][:]
+
    def init_from_string(self, c):
       self.trcks, self.wpts, self.rts = [], [], []    
       gpx = re.search("<gpx(?P<opts>.*?)>(?P<content>.*?)</gpx>", c,re.DOTALL+re.I)
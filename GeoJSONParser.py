@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+import json
+from GPXParser import GPXSegment
+
+# reading lines and polygons of a GeoJSON file as GPX track segments
+#
+# the features of a FeatureCollection are decoded one at a time from the file
+# and only the lines or rings intersecting the given bounding box are converted
+# to segments (coordinates are longitude, latitude as defined in RFC 7946)
+
+class JSONStream:
+   # buffer of a JSON file read by chunks, the values are decoded one at a time
+   # and the text already decoded is dropped when more of the file is read
+   def __init__(self, f, chunkSize):
+      self.f, self.chunkSize = f, chunkSize
+      self.decoder = json.JSONDecoder()
+      self.buf, self.pos, self.eof = "", 0, False
+
+   def read(self, size):
+      self.buf = self.buf[self.pos:]
+      self.pos = 0
+      more = self.f.read(size)
+      self.eof = more == ""
+      self.buf += more
+
+   def next(self):
+      # next character which is not a white space, "" at the end of the file
+      while True:
+         while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+            self.pos += 1
+         if self.pos < len(self.buf):
+            return self.buf[self.pos]
+         if self.eof:
+            return ""
+         self.read(self.chunkSize)
+
+   def expect(self, chars, what):
+      # skips one of the given characters, returns it
+      c = self.next()
+      if c == "" or c not in chars:
+         raise ValueError("%s expected in %s, found %s" %
+                          (what, self.f.name, repr(c) if c else "end of file"))
+      self.pos += 1
+      return c
+
+   def value(self):
+      if self.next() == "":
+         raise ValueError("value expected, found end of file in %s" % self.f.name)
+      while True:
+         try:
+            value, end = self.decoder.raw_decode(self.buf, self.pos)
+            if end < len(self.buf) or self.eof:
+               self.pos = end
+               return value
+            # a number may continue in the next chunk
+         except ValueError:
+            if self.eof:
+               raise
+         # value not complete in the buffer: read further
+         self.read(max(self.chunkSize, len(self.buf)))
+
+def streamFeatures(filename, chunkSize=1<<16):
+   # the members of the top-level object are decoded in turn up to the
+   # "features" array, whose items are then decoded one at a time
+   with open(filename, "r", encoding="utf8") as f:
+      stream = JSONStream(f, chunkSize)
+      stream.expect("{", "object")
+      members = {}
+      if stream.next() != "}":
+         while True:
+            key = stream.value()
+            if not isinstance(key, str):
+               raise ValueError("member name expected in %s, found %s" % (filename, repr(key)))
+            stream.expect(":", "':'")
+            if key == "features":
+               stream.expect("[", "array of features")
+               if stream.next() == "]":
+                  return
+               while True:
+                  yield stream.value()
+                  if stream.expect(",]", "',' or ']'") == "]":
+                     return
+            members[key] = stream.value()
+            if stream.expect(",}", "',' or '}'") == "}":
+               break
+      # not a FeatureCollection: single feature or geometry
+      yield members
+
+def geometryLines(geometry):
+   # list of lines (list of [lon, lat]) of a geometry
+   if not geometry:
+      return []
+   t = geometry.get("type")
+   if t == "LineString":
+      return [geometry["coordinates"]]
+   if t == "MultiLineString" or t == "Polygon":
+      return geometry["coordinates"]
+   if t == "MultiPolygon":
+      return [ring for polygon in geometry["coordinates"] for ring in polygon]
+   if t == "GeometryCollection":
+      return [line for g in geometry["geometries"] for line in geometryLines(g)]
+   return []
+
+def lineBbox(line):
+   lons = [p[0] for p in line]
+   lats = [p[1] for p in line]
+   return (min(lats), max(lats), min(lons), max(lons))
+
+def loadSegments(filename, latMin=-90.0, latMax=90.0, lonMin=-180.0, lonMax=180.0):
+   segs = []
+   nFeatures = 0
+   projected = False
+   for feature in streamFeatures(filename):
+      nFeatures += 1
+      if feature.get("type") == "Feature":
+         geometry = feature.get("geometry")
+         bbox = feature.get("bbox")
+      else:
+         geometry = feature
+         bbox = geometry.get("bbox")
+      if bbox and len(bbox) == 4 and \
+         (bbox[1] > latMax or bbox[3] < latMin or bbox[0] > lonMax or bbox[2] < lonMin):
+         continue
+      for line in geometryLines(geometry):
+         if len(line) == 0:
+            continue
+         (lineLatMin, lineLatMax, lineLonMin, lineLonMax) = lineBbox(line)
+         if lineLatMin < -90.0 or lineLatMax > 90.0 or lineLonMin < -180.0 or lineLonMax > 180.0:
+            projected = True
+         if lineLatMin > latMax or lineLatMax < latMin or lineLonMin > lonMax or lineLonMax < lonMin:
+            continue
+         seg = GPXSegment()
+         for p in line:
+            seg.append(float(p[1]), float(p[0]))
+         seg.bbox(lineLatMin, lineLatMax, lineLonMin, lineLonMax)
+         segs.append(seg)
+   if projected:
+      print ("Warning: coordinates out of longitude/latitude range, the file uses a projection...")
+   return nFeatures, segs
+
+if __name__=='__main__':
+   import sys
+
+   nFeatures, segs = loadSegments(sys.argv[1])
+   print ("Features:", nFeatures)
+   print ("Segments:", len(segs))
+   for s in segs[:10]:
+      print (len(s), s.bbox())
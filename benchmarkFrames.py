@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# benchmarkFrames
+#
+#   comparison of the writers of frames (PNG with several compression levels,
+#   PPM, TGA, QOI) on frames generated by generateAnimation.py
+#
+# Usage:
+#   python benchmarkFrames.py [ <frame files or directory> ]   (default: Images/map*.png)
+#
+# For each writer: speed in MB/s of RGB pixels and mean size of the files
+
+import glob
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+import generateAnimation
+
+def benchmarkWriters(frames,writers):
+
+  # frames: list of RGB images, writers: list of (name, format, PNG compression level)
+  pixels = sum(len(img.tobytes()) for img in frames)
+  results = []
+  for (name,imageFormat,level) in writers:
+    if generateAnimation.imageWriter(imageFormat) != imageFormat:
+      continue
+    size = 0
+    start = time.time()
+    for img in frames:
+      f = io.BytesIO()
+      generateAnimation.saveImage(img,f,imageFormat,level)
+      size += f.tell()
+    duration = max(time.time() - start, 1e-9)
+    results.append((name, pixels/duration/1e6, size/len(frames)))
+  return results
+
+if __name__=='__main__':
+
+  files = []
+  for arg in sys.argv[1:] or [generateAnimation.imagesDir]:
+    if os.path.isdir(arg):
+      files.extend(sorted(glob.glob(os.path.join(arg,'map*.png'))))
+    else:
+      files.append(arg)
+  if files == []:
+    print ('Usage: python benchmarkFrames.py [ <frame files or directory> ]')
+    print ('No frames found: generate some frames with generateAnimation.py first')
+    sys.exit(2)
+
+  # at most 50 frames taken along the animation
+  step = max(1, len(files) // 50)
+  frames = [Image.open(f).convert('RGB') for f in files[::step]]
+  print ('Frames:', len(frames), 'x', frames[0].size)
+
+  writers = [('png (default)','png',None)]
+  writers += [('png:%d'%level,'png',level) for level in (0,1,3,6,9)]
+  writers += [('ppm','ppm',None), ('tga','tga',None), ('qoi','qoi',None)]
+
+  print ('%-14s %10s %12s' % ('writer', 'MB/s', 'kB/frame'))
+  for (name, speed, size) in benchmarkWriters(frames,writers):
+    print ('%-14s %10.1f %12.1f' % (name, speed, size/1000))
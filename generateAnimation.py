@@ -65,7 +65,24 @@ import sys
 import time
 import math
 import getopt
+import csv
+import array
+import copy
+import struct
+import mmap
+import hashlib
+import json
+import pickle
+import glob
+import heapq
+import io
+import locale
+import multiprocessing
+import collections
+import concurrent.futures
+import datetime
 import GPXParser
+import GeoJSONParser
 import os.path
 
 import PIL
@@ -217,6 +234,8 @@ showCaches = [
 bigPixels = 0           # draw big pixels : 0, 1, 2 ,3
 noText = False          # drawing text and logos
 fatTrack = False        # drawing wider version of geocaching tracks
+frameInterval = 1       # number of calendar days shown by each frame of the animation (minimum with -s)
+videoDuration = None    # duration in seconds of the animation (-s option): the days of each frame follow the activity
 # last day of displayed period
 # can be set to another specific date
 
@@ -230,6 +249,11 @@ avatarsDir = 'Avatars/'        # default directory for avatars of geocachers
 logsDir = 'Logs/'              # default directory for pages of logs for geocachers
 cachesDir = 'Caches/'          # default directory for files of caches (CSV or GPX)
 imagesDir = 'Images/'          # directory of generated images
+compiledFrontiers = True       # keep a compiled copy (.seg) of frontier files to speed up loading
+timelinesDir = 'Timelines/'    # directory of compiled timelines (events loaded from the caches files)
+compiledTimelines = True       # reuse the compiled timeline when the caches files are unchanged
+layersDir = 'Layers/'          # directory of cached static layers (frontiers, logos, title and texts)
+cachedLayers = True            # reuse the static layer drawn with the same inputs
 
 def defaultPath(f, defaultDir):
   if os.path.exists(f):
@@ -244,6 +268,32 @@ else:
   xSize,ySize=1120,1080    # HD 1080p
 
 
+# columns of the CSV export file (GSAK view) in their default order
+csvColumns = ['Code','Cache Type','Note','Last4Logs','Last Log','Waypoint Name','Placed By','Placed',
+              'Last Found','Found','Country','Lat','Lon','Status','Url','Found by me','Owner Id']
+csvUsedColumns = ['Code','Cache Type','Last Log','Placed By','Placed','Country','Lat','Lon','Status','Url']
+
+timelineMagic = b'GCTIMEL1'  # format of compiled timelines
+layerMagic = 'GCLAYER1'      # format of cached static layers
+checkpointMagic = b'GCCHECK2' # format of the checkpoints of the drawing
+
+polygonBatch = 10000    # number of caches tested together against the polygons (-i option)
+csvProcesses = 1        # number of processes reading the CSV and HTML logs files (-j option)
+csvChunkSize = 4<<20    # size in bytes of the chunks of CSV files given to the processes
+renderProcesses = 1     # number of processes rendering the frames (-r option)
+keyframeInterval = 0    # frames between two saved states of the drawing (0: two shards by process)
+frameEncoders = os.cpu_count() or 1  # number of threads encoding the PNG frames (0: no thread)
+frameQueueLength = 8    # maximum number of frames waiting to be encoded
+reuseFrames = True      # a frame identical to the previous one isn't written again (listed in listPNG.txt)
+frameFormat = 'png'     # format of the frames: png, ppm (uncompressed), tga (run-length encoded) or qoi (-e option)
+pngCompressLevel = None # zlib level of the PNG frames, 0 (fast) to 9 (small), None for the PIL default
+videoFile = None        # video stream (.y4m, or .rgb for raw RGB, '-' for Y4M on stdout) instead of PNG files (-o option)
+videoFps = 24           # frames per second of the video
+leadingFrames = 50      # copies of the first frame at the beginning of the video
+tailFrames = 100        # still frames at the end of the video
+checkpointInterval = 500  # frames between two checkpoints of the drawing in imagesDir (0: only at the end)
+extendFrames = False    # only render the days after the last day of the previous run (-n option)
+
 # color types of items (caches, lines,...)
 ARCHIVED    = 0
 ACTIVE      = 1
@@ -256,15 +306,67 @@ POLYGON     = 7  # polygon to select a drawing area
 BARYCENTRE  = 8  # display barycentre of cache
 TRACK1      = 9  # color of second track
 TRACK2      = 10 # color of third track
+REMOVED     = -1 # event removed from the store (cache changed by an update of a timeline)
 
-# searching for a string pattern in a previously opened file
+# reading the "all logs" HTML page of a geocacher
+#
+# the page is read in a single pass: after the table of logs, each log is a
+# sequence of lines matching the patterns below, each one searched from the
+# line following the previous match
+
+logsTablePattern = re.compile('<table class="Table">', re.IGNORECASE)
+logsPatterns = [re.compile(p, re.IGNORECASE) for p in ('<tr','<img','<td>','<td>','<a')]
+logsTypePatterns = (re.compile('.*alt="'), re.compile('".*'))
+logsDatePatterns = (re.compile('</TD', re.IGNORECASE), re.compile('.*<(TD|td)> *'), re.compile(' .*'))
+logsGuidPatterns = (re.compile('.*guid='), re.compile('".*'))
+
+def readLogsFromHTML(fileName):
+
+  # yields (log type, date, guid) for each log of the page
+  (typeStart, typeEnd) = logsTypePatterns
+  (dateEnd, dateStart, dateSpace) = logsDatePatterns
+  (guidStart, guidEnd) = logsGuidPatterns
+  with open(fileName,'r',encoding="utf8") as fInput:
+    lines = iter(fInput)
+    for l in lines:
+      if logsTablePattern.search(l):
+        break
+    step = 0
+    for l in lines:
+      if not logsPatterns[step].search(l):
+        continue
+      if step == 1:
+        logType = typeEnd.sub('',typeStart.sub('',l.strip()))
+      elif step == 3:
+        if dateEnd.search(l):
+          dateString = dateSpace.sub('',dateStart.sub('',l)).strip()
+        else:
+          dateString = next(lines,'').strip()
+      elif step == 4:
+        guid = guidEnd.sub('',guidStart.sub('',l.strip()))
+        yield (logType,dateString,guid)
+        step = -1
+      step += 1
+
+def readLogsList(fileName):
 
-def fileFindNext(f,pattern):
+  return list(readLogsFromHTML(fileName))
 
-  l = f.readline()
-  while l != '' and not re.search(pattern,l, re.IGNORECASE):
-    l = f.readline()
-  return l
+def readLogsFiles(files,processes):
+
+  # the HTML pages of several geocachers are read by a pool of processes
+  if processes < 2 or len(files) < 2:
+    return {}
+  pool = multiprocessing.Pool(min(processes,len(files)))
+  try:
+    return dict(zip(files,pool.map(readLogsList,files)))
+  finally:
+    pool.close()
+    pool.join()
+
+def isLogsHTML(fileName):
+
+  return fileName[-5:].lower() == '.html' or fileName[-4:].lower() == '.htm'
 
 
 # compute distance between two points on Earth surface
@@ -350,31 +452,1008 @@ def getDistanceHaversine(lat1, lng1, lat2, lng2):
   return distance
 
 
-def isInsideZone(x, y, points):
-    """
-    Return True if a coordinate (x, y) is inside a polygon defined by
-    a list of verticies [(x1, y1), (x2, x2), ... , (xN, yN)].
-
-    Reference: http://www.ariel.com.au/a/python-point-int-poly.html
-    """
-    n = len(points)-1
-    inside = False
-    p1x, p1y = points[0].xy()
-    for i in range(1, n + 1):
-        p2x, p2y = points[i % n].xy()
-        if y > min(p1y, p2y):
-            if y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
+def parseDate(dateString):
+
+  if dateString != "":
+    strTime = dateString+" 00:00:01Z"
+    for pattern in ["%d/%m/%Y %H:%M:%SZ", "%Y/%m/%d %H:%M:%SZ", "%d/%b/%Y %H:%M:%SZ", "%d %b %y %H:%M:%SZ"]:
+      try:
+        t = int(time.mktime(time.strptime(strTime, pattern)))
+        return t
+      except:
+        pass
+  return 0
+
+
+def parseGPXTime(strTime):
+
+  strTime = re.sub('\..*','',strTime)
+  strTime = re.sub('Z$','',strTime)
+  return int(time.mktime(time.strptime(strTime, "%Y-%m-%dT%H:%M:%S")))
+
+
+def timelineKeys(files,ingestFilter):
+
+  # hashes of everything used to build the events: format, zone, selection
+  # of the caches and path of the input files (base key) and also
+  # size and modification time of the input files (key)
+  base = hashlib.sha1()
+  base.update(repr((timelineMagic, currentZone, zones[currentZone], ingestFilter.key(),
+                    csvColumns)).encode('utf8'))
+  for (f,status) in files:
+    base.update(repr((os.path.abspath(f), status)).encode('utf8'))
+  h = base.copy()
+  for (f,status) in files:
+    st = os.stat(f)
+    h.update(repr((st.st_size, st.st_mtime_ns)).encode('utf8'))
+  return (base.hexdigest()[:20], h.hexdigest()[:20])
+
+class PolygonIndex:
+
+  # index of the edges of the selection polygons (-i option)
+  #
+  # each polygon is cut in bands of longitude and each band keeps the edges
+  # crossing it, so the ray casting only looks at the few edges of the band of
+  # the tested point. Points are tested by batches.
+  # Reference of the ray casting: http://www.ariel.com.au/a/python-point-int-poly.html
+
+  def __init__(self,polygons,edgesPerBand=8):
+
+    self.polygons = []
+    for p in polygons:
+      xs, ys = p.lats, p.lons
+      n = len(xs)-1
+      if n < 1:
+        continue
+      (latMin, latMax, lonMin, lonMax) = p.bbox()
+      nBands = max(1, n // edgesPerBand)
+      width = (lonMax - lonMin) / nBands or 1.0
+      bands = [array.array('d') for b in range(nBands)]
+      p1x, p1y = xs[0], ys[0]
+      for i in range(1, n + 1):
+        p2x, p2y = xs[i % n], ys[i % n]
+        if p1y != p2y:
+          # horizontal edges are never crossed by the ray
+          first = min(nBands-1, max(0, int((min(p1y, p2y) - lonMin) / width)))
+          last = min(nBands-1, max(0, int((max(p1y, p2y) - lonMin) / width)))
+          for b in range(first, last+1):
+            bands[b].extend((p1x, p1y, p2x, p2y))
         p1x, p1y = p2x, p2y
-    return inside
+      self.polygons.append(((latMin, latMax, lonMin, lonMax), width, bands))
+
+  def inside(self,lats,lons):
+
+    # returns a bytearray with 1 for each point inside one of the polygons
+    result = bytearray(len(lats))
+    for ((latMin, latMax, lonMin, lonMax), width, bands) in self.polygons:
+      nBands = len(bands)
+      # points are grouped by band to walk each list of edges once per batch
+      candidates = {}
+      for k in range(len(lats)):
+        x, y = lats[k], lons[k]
+        if not result[k] and x >= latMin and x <= latMax and y >= lonMin and y <= lonMax:
+          b = min(nBands-1, max(0, int((y - lonMin) / width)))
+          candidates.setdefault(b, []).append(k)
+      for b, points in candidates.items():
+        edges = bands[b]
+        for k in points:
+          x, y = lats[k], lons[k]
+          inside = False
+          for e in range(0, len(edges), 4):
+            p1x, p1y, p2x, p2y = edges[e], edges[e+1], edges[e+2], edges[e+3]
+            if y > min(p1y, p2y) and y <= max(p1y, p2y) and x <= max(p1x, p2x):
+              if p1x == p2x or x <= (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x:
+                inside = not inside
+          if inside:
+            result[k] = 1
+    return result
+
+
+# operations returned by the reading of a chunk of CSV file
+EVENT_OP   = 0  # new event of a cache
+GUID_OP    = 1  # guid of a cache
+STATE_OP   = 2  # status and last log of a cache
+MESSAGE_OP = 3  # message to print
+ROWS_OP    = 4  # caches of all the rows of the chunk, in the order of the file (update of a timeline)
+
+class IngestFilter:
+
+  # selection of the caches read from the input files, built once from the options:
+  # excluded caches (-x), country of the zone (-z), owner (-g), cache types (-t),
+  # placing dates (-d) and bounding box of the zone
+  # the tests on raw fields are done by the readers before decoding coordinates
+
+  def __init__(self,zone,excludedCaches=[],geocacher=None,cacheTypes=None,firstDate=None,lastDate=None):
+
+    self.zone = zone
+    self.country = zone if zone[0] != '_' else None
+    (self.maxLat, self.minLat, self.minLon, self.maxLon) = zones[zone][1:5]
+    self.excludedCaches = frozenset(excludedCaches)
+    self.geocacher = geocacher
+    self.owner = re.compile(geocacher.upper()) if geocacher != None else None
+    self.cacheTypes = frozenset(cacheTypes) if cacheTypes else None
+    self.firstDate, self.lastDate = firstDate, lastDate
+    # the dates are whole days: GPX times are compared with the start of the
+    # first day and the end of the last day
+    self.startTime, self.endTime = None, None
+    if firstDate is not None:
+      day = time.localtime(firstDate)
+      self.startTime = int(time.mktime((day.tm_year,day.tm_mon,day.tm_mday,0,0,0,0,0,-1)))
+    if lastDate is not None:
+      day = time.localtime(lastDate)
+      self.endTime = int(time.mktime((day.tm_year,day.tm_mon,day.tm_mday+1,0,0,0,0,0,-1)))-1
+
+  def key(self):
+
+    # everything changing the selected caches, for the compiled timelines
+    return (self.zone, self.geocacher, sorted(self.excludedCaches),
+            sorted(self.cacheTypes) if self.cacheTypes else None, self.firstDate, self.lastDate)
+
+  def selective(self):
+
+    # true if caches can be rejected before being decoded
+    return bool(self.excludedCaches) or self.cacheTypes is not None or \
+           self.firstDate is not None or self.lastDate is not None
+
+  def acceptType(self,cacheType):
+
+    # GPX types are prefixed with 'Geocache|'
+    return self.cacheTypes is None or cacheType.rpartition('|')[2] in self.cacheTypes
+
+  def acceptDate(self,t):
+
+    return (self.startTime is None or t >= self.startTime) and (self.endTime is None or t <= self.endTime)
+
+  def isOwner(self,placedBy):
+
+    return self.owner is not None and self.owner.search(placedBy.upper()) is not None
+
+  def insideZone(self,lat,lon):
+
+    return self.minLat <= lat <= self.maxLat and self.minLon <= lon <= self.maxLon
+
+  def acceptElement(self,elem):
+
+    # <wpt> element of a GPX file, tested before the waypoint is built
+    if elem.findtext('{*}name','') in self.excludedCaches:
+      return False
+    if not self.acceptType(elem.findtext('{*}type','')):
+      return False
+    if self.firstDate is not None or self.lastDate is not None:
+      try:
+        return self.acceptDate(parseGPXTime(elem.findtext('{*}time','')))
+      except ValueError:
+        return False
+    return True
+
+  def acceptWaypoint(self,p):
+
+    # same tests on a waypoint read by the regex parser (GPX file not well-formed)
+    if p.attribs.get('name','') in self.excludedCaches:
+      return False
+    if not self.acceptType(p.attribs.get('type','')):
+      return False
+    if self.firstDate is not None or self.lastDate is not None:
+      try:
+        return self.acceptDate(parseGPXTime(p.attribs.get('time','')))
+      except ValueError:
+        return False
+    return True
+
+
+def csvChunks(fileName):
+
+  # byte ranges of about csvChunkSize bytes, cut at the end of a line outside
+  # the quoted fields (a quoted field may contain new lines): the quotes are
+  # counted from the start of the file, a doubled quote counting twice
+  size = os.path.getsize(fileName)
+  chunks = []
+  with open(fileName,'rb') as f:
+    start, pos = 0, 0
+    quoted = False
+    while True:
+      block = f.read(1<<20)
+      if not block:
+        break
+      i = 0
+      while True:
+        if pos+i < start+csvChunkSize:
+          j = min(len(block),start+csvChunkSize-pos)
+          quoted ^= block.count(b'"',i,j) & 1 == 1
+          i = j
+          if i == len(block):
+            break
+        n = block.find(b'\n',i)
+        if n < 0:
+          quoted ^= block.count(b'"',i) & 1 == 1
+          break
+        quoted ^= block.count(b'"',i,n) & 1 == 1
+        i = n+1
+        if not quoted:
+          chunks.append((fileName,start,pos+i))
+          start = pos+i
+      pos += len(block)
+  if start < size:
+    chunks.append((fileName,start,size))
+  return chunks
+
+
+class CSVChunkReader:
+
+  # reading of the caches of a range of lines of a CSV export file
+  # the caches are filtered and converted to a list of operations (events,
+  # guids, ...) applied afterwards by GCAnimation.applyCSVOperations,
+  # this can be done in the main process or in the processes of a pool
+
+  def __init__(self,columns,ingestFilter,polygonIndex,verbose=False):
+
+    self.columns = [columns[c] for c in csvUsedColumns]
+    self.nColumns = max(self.columns)+1
+    self.filter = ingestFilter
+    self.polygonIndex = polygonIndex
+    self.verbose = verbose
+    self.cacheStates = None   # known states of caches, to skip unchanged ones
+    self.convertedDates = {}
+
+  def convertDate(self,dateString):
+
+    try:
+      return self.convertedDates[dateString]
+    except KeyError:
+      t = self.convertedDates[dateString] = parseDate(dateString)
+      return t
+
+  def read(self,fileName,start,end):
+
+    with open(fileName,'rb') as f:
+      f.seek(start)
+      data = f.read(end-start)
+    lines = io.StringIO(data.decode(locale.getpreferredencoding(False)),newline='')
+    operations = []
+    pending = []
+    rows = []
+    ingestFilter = self.filter
+    for fields in csv.reader(lines):
+      if len(fields) > 0 and (fields[0] == "Code GC" or fields[0] == "Code"):
+        # line of headers in export file of GSAK
+        # tested for French and English
+        continue
+      if len(fields) < self.nColumns:
+        operations.append((MESSAGE_OP,"Problem in CSV: missing fields", fields))
+        continue
+      cache = [fields[c] for c in self.columns]
+      (name,country) = (cache[0],cache[5])
+
+      # new export of the same caches: only new caches or changes of status/last log are processed
+      state = (cache[8],cache[2])
+      if self.cacheStates is not None:
+        rows.append(name)
+        if self.cacheStates.get(name) == state:
+          continue
+      operations.append((STATE_OP,name,state))
+
+      # selection on the text fields, before decoding coordinates
+      if name in ingestFilter.excludedCaches:
+        if self.verbose: operations.append((MESSAGE_OP,"= EXCLUDED =",fields))
+        continue
+      elif ingestFilter.country is not None and country != ingestFilter.country:
+        # check if the cache in inside the country (Groundspeak field)
+        operations.append((MESSAGE_OP,'!!! Pb cache outside',ingestFilter.zone,':',name, country))
+        continue
+      elif not ingestFilter.acceptType(cache[1]) or not ingestFilter.acceptDate(self.convertDate(cache[4])):
+        if self.verbose: operations.append((MESSAGE_OP,"= FILTERED =",fields))
+        continue
+
+      if self.verbose: operations.append((MESSAGE_OP,"= TRY = ",fields))
+      pending.append(cache)
+      if len(pending) >= polygonBatch:
+        self.readCaches(pending,operations)
+        pending = []
+    self.readCaches(pending,operations)
+    if self.cacheStates is not None:
+      operations.append((ROWS_OP,rows))
+    return operations
+
+  def readCaches(self,caches,operations):
+
+    # caches are tested against the polygons by batches
+    lats = array.array('d',[float(c[6]) for c in caches])
+    lons = array.array('d',[float(c[7]) for c in caches])
+    if self.polygonIndex is not None:
+      inside = self.polygonIndex.inside(lats,lons)
+    else:
+      inside = bytearray(b'\1')*len(caches)
+    ingestFilter = self.filter
+
+    for k in range(len(caches)):
+      (name,cacheType,dateLastLog,placedBy,datePlaced,country,latitude,longitude,status,url) = caches[k]
+      if not inside[k]:
+        #print'!!! Outside of zone polygon', name, latitude, longitude
+        if self.verbose: operations.append((MESSAGE_OP,"= NOK =",caches[k]))
+        continue
+
+      if self.verbose: operations.append((MESSAGE_OP,"= OK =",caches[k]))
+
+      lat,lon = lats[k],lons[k]
+      guid = url.rpartition('guid=')[2]
+      operations.append((GUID_OP,guid,name,lat,lon))
+      if cacheType == "Event Cache" or cacheType == "Cache In Trash Out Event":
+        status = EVENT                     # Event cache
+      elif status == 'X':
+        status = ARCHIVED                  # Archived
+      elif status == 'T':
+        status = UNAVAILABLE               # Temporarily unavailable
+      else:
+        status = ACTIVE                    # Active cache
+
+      if not ingestFilter.insideZone(lat,lon):
+        operations.append((MESSAGE_OP,'!!! Pb point outside the drawing zone:', name, lat, lon, ' not in ',
+                           ingestFilter.minLat, ingestFilter.maxLat, ingestFilter.minLon, ingestFilter.maxLon))
+        continue
+
+      cacheTime = self.convertDate(datePlaced)
+      lastLogTime = self.convertDate(dateLastLog)
+
+      if status != EVENT:
+        # a non-event cache is active for a while after being placed
+        # uncertainty between placed date and publication date
+        # cache placed by geocacher : only work if no change in pseudos
+        if ingestFilter.isOwner(placedBy):
+          operations.append((EVENT_OP,name,lat,lon,PLACED,cacheTime))
+          # cache placed by geocacher : only work if no change in pseudos
+          operations.append((MESSAGE_OP,"Placed: "+name))
+        else:
+          operations.append((EVENT_OP,name,lat,lon,ACTIVE,cacheTime))
+        if status != ACTIVE:
+          # the cache isn't active anymore
+          if lastLogTime == 0:
+            # 20 days : dummy date for archiving time
+            lastLogTime = cacheTime + 20*24*3600
+          operations.append((EVENT_OP,name,lat,lon,status,lastLogTime))
+      else:
+        if ingestFilter.isOwner(placedBy):
+          operations.append((EVENT_OP,name,lat,lon,PLACED,cacheTime))
+          # cache placed by geocacher : only work if no change in pseudos
+          operations.append((MESSAGE_OP,"Placed: "+name))
+        else:
+          operations.append((EVENT_OP,name,lat,lon,status,cacheTime))
+
+
+# reader of the processes of the pool used for parallel loading
+workerReader = None
+
+def initCSVWorker(reader):
+
+  global workerReader
+  workerReader = reader
+
+def readCSVWorkerChunk(chunk):
+
+  return workerReader.read(*chunk)
+
+
+# animation, frames and keyframe interval of the parallel rendering (inherited by the forked processes)
+renderedAnimation = None
+
+def renderWorkerShard(shard):
+
+  (animation,frames,interval) = renderedAnimation
+  animation.renderShard(frames,shard,interval)
+
+
+# writers of the images: PIL format and options
+imageWriters = {
+  'png': ('PNG', {}),
+  'ppm': ('PPM', {}),
+  'tga': ('TGA', {'compression': 'tga_rle'}), # run-length encoding, fast and lossless
+  'qoi': ('QOI', {}),
+  }
+
+def imageWriter(imageFormat):
+
+  # QOI can be written since Pillow 11.3
+  if imageFormat == 'qoi':
+    Image.init()
+    if 'QOI' not in Image.SAVE:
+      print ("QOI format not supported by PIL, using PNG")
+      imageFormat = 'png'
+  if imageFormat not in imageWriters:
+    print ("Unknown image format:",imageFormat,", using PNG")
+    imageFormat = 'png'
+  return imageFormat
+
+def saveImage(img,fileName,imageFormat='png',compressLevel=None):
+
+  (pilFormat,options) = imageWriters[imageFormat]
+  if imageFormat == 'png' and compressLevel is not None:
+    options = dict(options,compress_level=compressLevel)
+  img.save(fileName,pilFormat,**options)
+
+
+class FrameEncoder:
+
+  # encoding of the frames by a pool of threads (the PNG compression doesn't
+  # hold the GIL) while the next frames are drawn. When queueLength frames are
+  # waiting, a new frame waits for the oldest one to be written.
+
+  repeatsFrames = False   # true if still frames are repeated by the encoder itself
+
+  def __init__(self,workers=None,queueLength=None,imageFormat=None):
+
+    # default values are taken from the parameters (which can be set by options)
+    workers = frameEncoders if workers is None else workers
+    queueLength = frameQueueLength if queueLength is None else queueLength
+    self.format = imageWriter(frameFormat if imageFormat is None else imageFormat)
+    self.pool = concurrent.futures.ThreadPoolExecutor(workers) if workers > 0 else None
+    self.queueLength = max(1,queueLength)
+    self.pending = collections.deque()
+
+  def submit(self,function,*args):
+
+    if self.pool is None:
+      function(*args)
+      return
+    while len(self.pending) >= self.queueLength:
+      self.pending.popleft().result()
+    self.pending.append(self.pool.submit(function,*args))
+
+  def writeFrame(self,n,img):
+
+    # the image mustn't be modified afterwards
+    self.submit(saveImage,img,imagesDir+'map%04d.%s'%(n,self.format),self.format,pngCompressLevel)
+
+  def repeatFrame(self,n,source):
+
+    # frame n is the same as frame source: the file of source is listed instead
+    pass
+
+  def flush(self):
+
+    # wait for all the frames to be written
+    while self.pending:
+      self.pending.popleft().result()
+
+  def close(self):
+
+    if self.pool is None:
+      return
+    try:
+      self.flush()
+    finally:
+      self.pool.shutdown()
+
+
+class VideoEncoder(FrameEncoder):
+
+  # frames written in a single stream that an encoder can read directly:
+  # YUV4MPEG2 (4:2:0, full range) or raw RGB24 if the file name ends with .rgb
+  # the output can be a file, a named pipe or stdout ('-')
+  # one thread converts and writes the frames so their order is kept
+
+  repeatsFrames = True
+
+  def __init__(self,output,queueLength=None):
+
+    FrameEncoder.__init__(self,1 if frameEncoders > 0 else 0,queueLength,'png')
+    self.raw = output.lower().endswith('.rgb')
+    if output == '-':
+      self.stream = sys.__stdout__.buffer
+    else:
+      self.stream = open(output,'wb')
+    self.header = False
+    self.lastFrame = None
+
+  def writeFrame(self,n,img):
+
+    self.submit(self.write,img)
+
+  def repeatFrame(self,n,source):
+
+    self.repeatLastFrame(1)
+
+  def repeatLastFrame(self,count):
+
+    # still frames are written again without being drawn and converted
+    self.submit(self.repeat,count)
+
+  def write(self,img):
+
+    if self.raw:
+      frame = img.tobytes()
+    else:
+      if not self.header:
+        self.stream.write(b'YUV4MPEG2 W%d H%d F%d:1 Ip A1:1 C420jpeg XCOLORRANGE=FULL\n' % (img.size[0],img.size[1],videoFps))
+        self.header = True
+      (y,cb,cr) = img.convert('YCbCr').split()
+      frame = b''.join([b'FRAME\n',y.tobytes(),cb.reduce(2).tobytes(),cr.reduce(2).tobytes()])
+    self.stream.write(frame)
+    self.lastFrame = frame
+
+  def repeat(self,count):
+
+    if self.lastFrame is not None:
+      for i in range(count):
+        self.stream.write(self.lastFrame)
+
+  def close(self):
+
+    try:
+      FrameEncoder.close(self)
+    finally:
+      if self.stream is sys.__stdout__.buffer:
+        self.stream.flush()
+      else:
+        self.stream.close()
+
+
+class EventStore:
+
+  # columnar storage of the events (creation, archiving, visit, ...) of caches
+  # cache ids are interned, each event is a row of the typed arrays
+  # and the rows are viewed sorted by time when generating the images
+  #
+  # when a compiled timeline is updated, the events of the changed caches are
+  # marked as removed and the new ones are added at the end with a rank placing
+  # them between the events of the unchanged caches around them in the file:
+  # the events of a time are ordered by rank (by row otherwise) and the rows
+  # are put in the order of the ranks when the timeline is saved
+
+  # typed columns saved in compiled timelines
+  columns = [('cacheLats','d'), ('cacheLons','d'), ('caches','i'), ('statuses','b'), ('times','q'),
+             ('lats','d'), ('lons','d'), ('xs','i'), ('ys','i'), ('order','i')]
+
+  def __init__(self):
+
+    self.names = []                 # cache ids, indexed by cache number
+    self.numbers = {}               # cache id -> cache number
+    self.cacheLats = array.array('d')   # last coordinates of each cache
+    self.cacheLons = array.array('d')
+    self.caches = array.array('i')  # cache number of each event
+    self.statuses = array.array('b')
+    self.times = array.array('q')
+    self.lats = array.array('d')
+    self.lons = array.array('d')
+    self.xs = array.array('i')      # position of the events in the images (see project)
+    self.ys = array.array('i')
+    self.keys = set()               # (time, cache, status) of events for de-duplication
+    self.order = None               # events sorted by time
+    self.nSorted = 0                # number of rows already sorted in order
+    self.ranks = None               # rank of each event when it isn't its row (update of a timeline)
+    self.cacheEvents = None         # cache number -> rows of its events (update of a timeline)
+    self.nRemoved = 0               # events removed since the order was computed
+
+  def __len__(self):
+
+    return len(self.times)
+
+  def intern(self,name):
+
+    try:
+      return self.numbers[name]
+    except KeyError:
+      n = self.numbers[name] = len(self.names)
+      self.names.append(name)
+      self.cacheLats.append(0.0)
+      self.cacheLons.append(0.0)
+      return n
+
+  def coords(self,name):
+
+    n = self.numbers[name]
+    return (self.cacheLats[n],self.cacheLons[n])
+
+  def add(self,name,lat,lon,status,eventTime):
+
+    # returns False if the event is already known (same cache, status and time)
+    if self.keys is None:
+      self.detach()
+    n = self.intern(name)
+    self.cacheLats[n], self.cacheLons[n] = lat, lon
+    key = ((eventTime << 32) | n) << 4
+    if key|status in self.keys or key|PLACED in self.keys:
+      return False
+    self.keys.add(key|status)
+    if self.ranks is not None:
+      # after all the events, until it is placed
+      self.ranks.append(float(len(self.times)))
+      self.cacheEvents.setdefault(n,[]).append(len(self.times))
+    self.caches.append(n)
+    self.statuses.append(status)
+    self.times.append(eventTime)
+    self.lats.append(lat)
+    self.lons.append(lon)
+    return True
+
+  def retract(self,names):
+
+    # removes the events of the caches, except the visits of the geocacher, when
+    # their state changed (update of a timeline): the events of their new state
+    # are added at the end and placed afterwards
+    if self.keys is None:
+      self.detach()
+    if self.cacheEvents is None:
+      self.cacheEvents = {}
+      for (i,n) in enumerate(self.caches):
+        self.cacheEvents.setdefault(n,[]).append(i)
+      self.ranks = array.array('d',range(len(self.times)))
+      self.nSorted = len(self.order) if self.order is not None else 0
+    caches, statuses, times = self.caches, self.statuses, self.times
+    for name in names:
+      n = self.numbers.get(name)
+      if n is None:
+        continue
+      kept = []
+      for i in self.cacheEvents.get(n,()):
+        if statuses[i] == TRACK:
+          kept.append(i)
+        elif statuses[i] != REMOVED:
+          self.keys.discard((((times[i] << 32) | n) << 4) | statuses[i])
+          statuses[i] = REMOVED
+          self.nRemoved += 1
+      self.cacheEvents[n] = kept
+
+  def cacheRanks(self,name):
+
+    # first and last ranks of the events of a cache other than visits, None if it has none
+    n = self.numbers.get(name)
+    if n is None or self.ranks is None:
+      return None
+    ranks = [self.ranks[i] for i in self.cacheEvents.get(n,()) if self.statuses[i] != TRACK]
+    return (min(ranks),max(ranks)) if ranks else None
+
+  def place(self,rows,low,high,limit):
+
+    # gives to the events of the rows ranks between low and high, in the order of the rows
+    # a missing bound is the nearest rank of the events before limit (the events of the update)
+    if low is None or high is None:
+      ranks, statuses = self.ranks, self.statuses
+      if low is None and high is not None:
+        low = max((ranks[i] for i in range(limit) if ranks[i] < high and statuses[i] != REMOVED),default=high-1.0)
+      elif high is None:
+        if low is None:
+          low = max((ranks[i] for i in range(limit) if statuses[i] != REMOVED),default=-1.0)
+        high = min((ranks[i] for i in range(limit) if ranks[i] > low and statuses[i] != REMOVED),default=low+1.0)
+    step = (high-low)/(len(rows)+1)
+    for (k,i) in enumerate(sorted(set(rows))):
+      self.ranks[i] = low + step*(k+1)
+
+  def project(self,latlon2xy):
+
+    # positions in the images of the events not projected yet
+    for i in range(len(self.xs),len(self.times)):
+      (x,y) = latlon2xy(self.lats[i],self.lons[i])
+      self.xs.append(x)
+      self.ys.append(y)
+
+  def sortedEvents(self):
+
+    # events sorted by time, the last added event (highest rank) of a given time comes first
+    # events added since the last call are sorted and merged into the order
+    times = self.times
+    if self.ranks is None:
+      if self.order is None:
+        self.order = array.array('i',sorted(range(len(times)-1,-1,-1), key=times.__getitem__))
+      elif len(self.order) < len(times):
+        added = sorted(range(len(times)-1,len(self.order)-1,-1), key=times.__getitem__)
+        self.order = array.array('i',heapq.merge(added,self.order,key=times.__getitem__))
+      self.nSorted = len(times)
+      return self.order
+    ranks, statuses = self.ranks, self.statuses
+    key = lambda i: (times[i],-ranks[i])
+    if self.order is None:
+      self.order = array.array('i',sorted((i for i in range(len(times)) if statuses[i] != REMOVED), key=key))
+    elif self.nSorted < len(times) or self.nRemoved > 0:
+      added = sorted((i for i in range(self.nSorted,len(times)) if statuses[i] != REMOVED), key=key)
+      kept = (i for i in self.order if statuses[i] != REMOVED) if self.nRemoved > 0 else self.order
+      self.order = array.array('i',heapq.merge(added,kept,key=key))
+    self.nSorted = len(times)
+    self.nRemoved = 0
+    return self.order
+
+  def compact(self):
+
+    # after an update: the removed events are dropped and the rows are put in the
+    # order of their ranks, as in a timeline built from the files
+    if self.ranks is None:
+      return
+    order = self.sortedEvents()
+    ranks, statuses = self.ranks, self.statuses
+    n = len(self.times)
+    rows = sorted((i for i in range(n) if statuses[i] != REMOVED), key=ranks.__getitem__)
+    for column in ('caches','statuses','times','lats','lons','xs','ys'):
+      data = getattr(self,column)
+      if len(data) == n:
+        setattr(self,column,array.array(data.typecode,[data[i] for i in rows]))
+      else:
+        # positions not computed yet
+        setattr(self,column,array.array(data.typecode))
+    position = array.array('i',[0])*len(ranks)
+    for (k,i) in enumerate(rows):
+      position[i] = k
+    self.order = array.array('i',[position[i] for i in order])
+    # caches numbered in the order of their first event
+    numbers = {}
+    caches = self.caches
+    for i in range(len(caches)):
+      caches[i] = numbers.setdefault(caches[i],len(numbers))
+    previous = sorted(numbers,key=numbers.__getitem__)
+    self.names = [self.names[n] for n in previous]
+    self.numbers = dict((name,n) for (n,name) in enumerate(self.names))
+    self.cacheLats = array.array('d',[self.cacheLats[n] for n in previous])
+    self.cacheLons = array.array('d',[self.cacheLons[n] for n in previous])
+    self.keys = set((((t << 32) | n) << 4) | status for (t,n,status) in zip(self.times,self.caches,self.statuses))
+    self.nSorted = len(self.times)
+    self.ranks = None
+    self.cacheEvents = None
+    self.nRemoved = 0
+
+  def save(self,f):
+
+    # names and typed columns, to be read back by attach
+    self.compact()
+    names = '\n'.join(self.names).encode('utf8')
+    self.sortedEvents()
+    f.write(struct.pack('=q',len(names)))
+    f.write(names + b'\0' * (-len(names) % 8))
+    for (column,typecode) in self.columns:
+      data = getattr(self,column).tobytes()
+      f.write(struct.pack('=q',len(data)))
+      f.write(data + b'\0' * (-len(data) % 8))
+
+  def attach(self,buffer,offset):
+
+    # columns are used directly from the buffer (memory map of a compiled timeline)
+    # until new events are added, returns the offset after the data
+    (size,) = struct.unpack_from('=q',buffer,offset)
+    offset += 8
+    names = bytes(buffer[offset:offset+size]).decode('utf8')
+    self.names = names.split('\n') if names else []
+    self.numbers = dict((name,n) for (n,name) in enumerate(self.names))
+    offset += size + (-size % 8)
+    for (column,typecode) in self.columns:
+      (size,) = struct.unpack_from('=q',buffer,offset)
+      offset += 8
+      setattr(self,column,buffer[offset:offset+size].cast(typecode))
+      offset += size + (-size % 8)
+    self.keys = None
+    return offset
+
+  def detach(self):
+
+    # copy of the columns from the memory map before modifying them
+    for (column,typecode) in self.columns:
+      data = array.array(typecode)
+      data.frombytes(getattr(self,column).cast('B'))
+      setattr(self,column,data)
+    self.keys = set((((t << 32) | n) << 4) | status for (t,n,status) in zip(self.times,self.caches,self.statuses))
+
+
+class Timeline:
+
+  # index of the events by calendar day, or by periods of several days
+  # each period gives exactly one frame of the animation, empty or not
+  #
+  # the periods have interval days, or with a number of frames, a length
+  # chosen from the activity: the quiet days are gathered in long periods
+  # and the busy days get their own frame. The days after lastTime (future
+  # events) have one period each.
+
+  def __init__(self,events,interval=1,frames=None,lastTime=None):
+
+    self.interval = interval
+    self.groups = []         # events of each period
+    self.starts = []         # first calendar day of each period, and day after the last period
+    self.firstDay = None     # ordinal of the first calendar day
+    days = []                # (calendar day, events of the day)
+    dayOrdinals = {}
+    times = events.times
+    for i in events.sortedEvents():
+      t = times[i]
+      try:
+        day = dayOrdinals[t]
+      except KeyError:
+        day = dayOrdinals[t] = datetime.date.fromtimestamp(t).toordinal()
+      if len(days) == 0 or days[-1][0] != day:
+        days.append((day,[]))
+      days[-1][1].append(i)
+    if len(days) == 0:
+      return
+
+    self.firstDay = days[0][0]
+    lastEventDay = days[-1][0]
+    endDay = lastEventDay
+    if lastTime is not None:
+      endDay = max(self.firstDay, min(endDay, datetime.date.fromtimestamp(lastTime).toordinal()))
+    if frames:
+      self.starts = self.schedule(days,endDay,frames)
+    else:
+      self.starts = list(range(self.firstDay,endDay+1,interval))
+    self.starts += list(range(endDay+1,lastEventDay+1))
+    self.starts.append(lastEventDay+1)
+
+    self.groups = [[] for period in range(len(self.starts)-1)]
+    period = 0
+    for (day,group) in days:
+      while self.starts[period+1] <= day:
+        period += 1
+      self.groups[period].extend(group)
+
+  def schedule(self,days,endDay,frames):
+
+    # first days of at most frames periods from firstDay to endDay, each one of
+    # at least interval days: the cost of a day is its number of events plus
+    # the mean number of events by day (so the time still goes on during the
+    # quiet periods), the smallest cost by period giving frames periods is found
+    # by bisection
+    counts = [0]*(endDay-self.firstDay+1)
+    for (day,group) in days:
+      if day <= endDay:
+        counts[day-self.firstDay] = len(group)
+    mean = sum(counts)/len(counts)
+    costs = [count+mean for count in counts]
+
+    def cut(budget):
+      starts = [self.firstDay]
+      cost = 0.0
+      for (d,c) in enumerate(costs):
+        if self.firstDay+d-starts[-1] >= self.interval and cost+c > budget:
+          starts.append(self.firstDay+d)
+          cost = 0.0
+        cost += c
+      return starts
+
+    (low,high) = (0.0,sum(costs))
+    starts = cut(high)
+    for i in range(60):
+      budget = (low+high)/2
+      periods = cut(budget)
+      if len(periods) <= frames:
+        (high,starts) = (budget,periods)
+      else:
+        low = budget
+    return starts
+
+  def __len__(self):
+
+    return len(self.groups)
+
+  def dayTime(self,day):
+
+    # time of a calendar day, as given by convertDate
+    return int(time.mktime(datetime.date.fromordinal(day).timetuple())) + 1
+
+  def firstTime(self):
+
+    return self.dayTime(self.firstDay)
+
+  def frameTime(self,period):
+
+    # the frame shows the state at the last day of the period
+    return self.dayTime(self.starts[period+1]-1)
+
+  def dayTimes(self,period):
+
+    return [self.dayTime(day) for day in range(self.starts[period], self.starts[period+1])]
+
+  def __iter__(self):
+
+    for period in range(len(self.groups)):
+      yield (self.frameTime(period), self.dayTimes(period), self.groups[period])
+
+
+class FlashRing:
+
+  # points flashing during the last frames, for both flashes (0: archived
+  # cache, 1: active cache): a ring of one slot by step of the flash animation,
+  # the slot of the cursor receiving the points of the current frame.
+  # The coordinates of the points of a flash in a slot are kept in typed arrays
+  # which are reused (only the count is reset) when the cursor comes back to
+  # the slot, so the arrays grow to the busiest frame and no more. The points of
+  # a slot are the first counts[flash][slot] items of its arrays.
+
+  def __init__(self,length):
+
+    self.length = length
+    self.cursor = 0
+    self.counts = [[0]*length for flash in range(0,2)]   # number of points of each slot
+    self.xs = [[array.array('i') for i in range(length)] for flash in range(0,2)]
+    self.ys = [[array.array('i') for i in range(length)] for flash in range(0,2)]
+
+  def add(self,flash,x,y):
+
+    slot = self.cursor
+    n = self.counts[flash][slot]
+    xs = self.xs[flash][slot]
+    if n < len(xs):
+      xs[n] = x
+      self.ys[flash][slot][n] = y
+    else:
+      xs.append(x)
+      self.ys[flash][slot].append(y)
+    self.counts[flash][slot] = n + 1
+
+  def flashing(self):
+
+    return any(self.counts[0]) or any(self.counts[1])
+
+  def advance(self):
+
+    # next step of the animation: the oldest points stop flashing
+    self.cursor = (self.cursor - 1) % self.length
+    for flash in range(0,2):
+      self.counts[flash][self.cursor] = 0
+
+
+class TextStrip:
+
+  # lines of text of a fixed width font drawn at the same positions on each
+  # frame: the mask of each line is kept and only the characters changed since
+  # the previous frame are copied into it from the masks of the glyphs (one cell
+  # of the width of a character each, rendered once), then the line is drawn
+  # with a single paste. A glyph wider than its cell (or a font without a fixed
+  # integer width) is drawn with ImageDraw.text.
+
+  def __init__(self,font):
+
+    self.font = font
+    self.advance = font.getlength('0')
+    (ascent,descent) = font.getmetrics()
+    self.height = ascent + descent
+    self.glyphs = {}         # character -> mask of its cell, None if it can't be cached
+    self.lines = {}          # position -> (text, mask of the line)
+
+  def glyph(self,c):
+
+    try:
+      return self.glyphs[c]
+    except KeyError:
+      pass
+    cell = None
+    (left,top,right,bottom) = self.font.getbbox(c)
+    if self.advance == int(self.advance) and self.font.getlength(c) == self.advance and \
+       left >= 0 and top >= 0 and right <= self.advance and bottom <= self.height:
+      cell = Image.new('L',(int(self.advance),self.height),0)
+      ImageDraw.Draw(cell).text((0,0),c,font=self.font,fill=255)
+    self.glyphs[c] = cell
+    return cell
+
+  def box(self,position):
+
+    # area of the line drawn at the position, None if it isn't drawn from the masks
+    (text,mask) = self.lines.get(position,('',None))
+    if mask is None:
+      return None
+    (x,y) = position
+    return (x,y,x+mask.size[0],y+self.height)
+
+  def draw(self,img,position,text,color):
+
+    (previous,mask) = self.lines.get(position,('',None))
+    if text != previous:
+      cells = [self.glyph(c) for c in text]
+      if None in cells:
+        self.lines.pop(position,None)
+        ImageDraw.Draw(img).text(position,text,font=self.font,fill=color)
+        return
+      width = int(self.advance)
+      if mask is None or len(text) != len(previous):
+        line = Image.new('L',(width*len(text),self.height),0)
+        if mask is not None:
+          common = min(len(text),len(previous))
+          line.paste(mask.crop((0,0,width*common,self.height)),(0,0))
+        (mask,previous) = (line,previous[:len(text)])
+      for (i,c) in enumerate(text):
+        if i >= len(previous) or c != previous[i]:
+          mask.paste(cells[i],(i*width,0))
+      self.lines[position] = (text,mask)
+    if mask.size[0] > 0:
+      (x,y) = position
+      img.paste(color,(x,y,x+mask.size[0],y+self.height),mask)
+
 
 class GCAnimation:
 
-  def __init__(self,currentZone,printing=False, backgroundColor="black", excludedCaches=[]):
+  def __init__(self,currentZone,printing=False, backgroundColor="black", ingestFilter=None):
 
     # getting zone parameters
     (title, maxLat, minLat, minLon, maxLon, scaleXY, offsetXY) = zones[currentZone]
@@ -388,11 +1467,16 @@ class GCAnimation:
 
     self.frontiers = []
     self.polygons = []
+    self.polygonIndex = None    # index of the edges of polygons, built when needed
     self.geocacher = None
     self.printing = printing
     self.color = backgroundColor
-    self.excludedCaches = excludedCaches
+    self.ingestFilter = ingestFilter or IngestFilter(currentZone)  # selection of the caches
     self.guids = {}
+    self.convertedDates = {}
+    self.cacheStates = {}   # status and last log of caches in the CSV files
+    self.delta = False      # only process the caches whose state changed (update of a compiled timeline)
+    self.nAddedEvents = 0   # events added by newItem, also when the caches come from a compiled timeline
 
     print ("Background color:",self.color)
     if self.color == "white":
@@ -419,6 +1503,7 @@ class GCAnimation:
         self.fontArial = ImageFont.truetype ( fontPath, 40 ) # 1080p
       self.fontArialSmall = ImageFont.truetype ( fontPath, 16 )
       self.fontFixed = ImageFont.truetype ( fontPathFixed, 32 )
+      self.textStrip = TextStrip(self.fontFixed)
     except:
       print ("Problem initializing fonts")
       sys.exit()
@@ -441,9 +1526,8 @@ class GCAnimation:
     self.LX,self.LY = xSize,ySize
     print ('Original dimensions:', self.LX, self.LY)
 
-    self.allWpts = {}       # list of all GC waypoints
-    self.coords = {}        # coordinates of GC waypoints
-    self.wptStatus = {}     # status of GC waypoints (active, archived, ...)
+    self.events = EventStore()  # events of all GC waypoints
+    self.wptStatus = None   # status of GC waypoints (active, archived, ...), by cache number
     self.tracks = []        # list of visit tracks to display
     self.tracksCoords = []  # last coordinate on track displayed
     self.tracksName = []    # name of geocacher or name of TB
@@ -527,19 +1611,36 @@ class GCAnimation:
         TRACK       : (0,150,0),     # light green
         }
 
-    self.flashCursor = 0
-    self.flashLength = len(self.flashAnimation[0])
-    self.flashList = {}
-    for active in range(0,2):
-      self.flashList[active] = {}
-      for i in range(0,self.flashLength):
-        self.flashList[active][i] = []
-
-
-  def drawPoint(self,status,x,y):
-
-    self.imResult.putpixel((x,y),self.cacheColor[status])
-    shape = []
+    self.dotStamps = {}     # color and mask of the dots of caches, by status
+    self.mapChanged = True  # something was drawn in imResult since the last frame
+    self.lastFrame = None   # number and texts of the last frame if it had no flash
+    self.staticFrame = None # image and texts of the last frame drawn if it had no flash
+    self.frameSources = {}  # frames identical to a previous frame: number of the frame written
+    self.warnings = True    # messages about the items that can't be drawn
+    self.keyframes = []     # states of the drawing for the parallel rendering
+
+    # mask and radius of each step of the flash animations
+    self.flashStamps = {}
+    for status in self.flashAnimation:
+      self.flashStamps[status] = {}
+      for (step,shape) in self.flashAnimation[status].items():
+        stamp = None
+        if len(shape) > 0:
+          r = max(max(abs(dx),abs(dy)) for (dx,dy) in shape)
+          mask = Image.new('L',(2*r+1,2*r+1),0)
+          for (dx,dy) in shape:
+            mask.putpixel((dx+r,dy+r),255)
+          stamp = (mask,r)
+        self.flashStamps[status][step] = stamp
+
+    self.flashRing = FlashRing(len(self.flashAnimation[0]))
+
+
+  def dotStamp(self,status):
+
+    # stamp of the dot of a cache, built once for each status: color and mask
+    # of the shape (no mask for a single pixel)
+    shape = [(0,0)]
     if bigPixels > 0:
       shape += [(1,0),(0,1),(1,1)]
     if bigPixels > 1 or status == PLACED:
@@ -548,8 +1649,39 @@ class GCAnimation:
       shape += [(-2,0),(0,-2),(2,0),(0,2),(-2,-2),(-2,2),(2,-2),(2,2)]
       shape += [(-2,1),(1,-2),(2,1),(1,2)]
       shape += [(-2,-1),(-1,-2),(2,-1),(-1,2)]
-    for (dx,dy) in shape:
-      self.imResult.putpixel((x+dx,y+dy),self.cacheColor[status])
+    mask = None
+    if len(shape) > 1:
+      mask = Image.new('L',(5,5),0)
+      for (dx,dy) in shape:
+        mask.putpixel((dx+2,dy+2),255)
+    self.dotStamps[status] = (self.cacheColor[status],mask)
+    return self.dotStamps[status]
+
+
+  def drawPoints(self,dots):
+
+    # draw a batch of dots (status,x,y) in the given order, clipped to the image
+    # a dot whose center is outside the image is reported and skipped
+    if len(dots) > 0:
+      self.mapChanged = True
+    pixels = self.imResult.load()
+    (LX,LY) = self.imResult.size
+    paste = self.imResult.paste
+    for (status,x,y) in dots:
+      if not (0 <= x < LX and 0 <= y < LY):
+        if self.warnings:
+          print ('!!! Problem - dot outside the image:', x, y, status)
+        continue
+      (color,mask) = self.dotStamps.get(status) or self.dotStamp(status)
+      if mask is None:
+        pixels[x,y] = color
+      else:
+        paste(color,(x-2,y-2,x+3,y+3),mask)
+
+
+  def drawPoint(self,status,x,y):
+
+    self.drawPoints([(status,x,y)])
 
 
   def newItem(self,name,lat,lon,status,eventTime):
@@ -557,33 +1689,33 @@ class GCAnimation:
     if eventTime == None:
       print ("Problem with time of cache ",name)
       sys.exit()
-    self.coords[name] = (lat,lon)
-    try:
-      if not (lat,lon,name,status) in self.allWpts[eventTime] \
-             and not (lat,lon,name,PLACED) in self.allWpts[eventTime]:
-        self.allWpts[eventTime].insert(0,(lat,lon,name,status))
-        self.nAddedEvents += 1
-    except Exception as msg:
-      self.allWpts[eventTime] = [(lat,lon,name,status)]
+    if self.events.add(name,lat,lon,status,eventTime):
       self.nAddedEvents += 1
     return
 
 
   def convertDate(self,dateString):
 
-    if dateString != "":
-      strTime = dateString+" 00:00:01Z"
-      for pattern in ["%d/%m/%Y %H:%M:%SZ", "%Y/%m/%d %H:%M:%SZ", "%d/%b/%Y %H:%M:%SZ", "%d %b %y %H:%M:%SZ"]:
-        try:
-          t = int(time.mktime(time.strptime(strTime, pattern)))
-          return t
-        except:
-          pass
-    return 0
+    # dates are repeated a lot in an export file: conversions are memorized
+    try:
+      return self.convertedDates[dateString]
+    except KeyError:
+      t = self.convertedDates[dateString] = parseDate(dateString)
+      return t
 
 
   def loadFromFile(self,file,geocacher=None,status=ACTIVE):
 
+    self.setGeocacher(geocacher)
+
+    if file[-4:].lower() == '.gpx':
+      self.loadFromGPX(file,status=status)
+    else:
+      self.loadFromCSV(file)
+
+
+  def setGeocacher(self,geocacher):
+
     if geocacher:
       if re.search("\|",geocacher):
         self.geocacher = re.sub("\(([^|]+)\|.*\)","\\1",geocacher)
@@ -593,10 +1725,46 @@ class GCAnimation:
       if os.path.isfile(logoGeocacher):
         logos.append((logoGeocacher,1035,20, 224, 224))
 
-    if file[-4:].lower() == '.gpx':
-      self.loadFromGPX(file,status=status)
-    else:
-      self.loadFromCSV(file,geocacher)
+
+  def saveTimeline(self,fileName,key):
+
+    # compiled timeline: key of the inputs, zone, guids of caches and columns of events
+    try:
+      os.mkdir(timelinesDir)
+    except OSError:
+      pass
+    info = json.dumps({'zone': currentZone, 'parameters': zones[currentZone], 'guids': self.guids,
+                       'states': self.cacheStates}).encode('utf8')
+    self.events.project(self.latlon2xy)
+    with open(fileName+'.tmp','wb') as f:
+      f.write(struct.pack('=8s1s7x40sq',timelineMagic,sys.byteorder[0].encode(),key.encode(),len(info)))
+      f.write(info + b'\0' * (-len(info) % 8))
+      self.events.save(f)
+    os.replace(fileName+'.tmp',fileName)
+    print ('Compiled timeline:',fileName)
+
+
+  def loadTimeline(self,fileName,key):
+
+    # returns False if there is no compiled timeline for these inputs
+    try:
+      with open(fileName,'rb') as f:
+        self.timelineMap = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    except (IOError,ValueError):
+      return False
+    buffer = memoryview(self.timelineMap)
+    (magic,order,fileKey,size) = struct.unpack_from('=8s1s7x40sq',buffer,0)
+    if magic != timelineMagic or order != sys.byteorder[0].encode() or fileKey.rstrip(b'\0') != key.encode():
+      return False
+    offset = 64
+    info = json.loads(bytes(buffer[offset:offset+size]).decode('utf8'))
+    offset += size + (-size % 8)
+    self.guids = dict((guid,tuple(cache)) for (guid,cache) in info['guids'].items())
+    self.cacheStates = dict((name,tuple(state)) for (name,state) in info['states'].items())
+    self.events.attach(buffer,offset)
+    self.nAddedEvents = 0
+    print ('Timeline loaded from compiled file:',fileName,len(self.events),'events')
+    return True
 
 
   def addGeocacherLogs(self):
@@ -604,15 +1772,15 @@ class GCAnimation:
       for d in self.tracks[0]:
         for c in self.tracks[0][d]:
           try:
-            (lat,lon) = self.coords[c]
+            (lat,lon) = self.events.coords(c)
             self.newItem(c,lat,lon,TRACK,d)
           except:
             continue
 
-  def loadLogsFromFile(self,myFile):
+  def loadLogsFromFile(self,myFile,logs=None):
 
-    if myFile[-5:].lower() == '.html' or myFile[-4:].lower() == '.htm':
-      self.loadLogsFromHTML(myFile)
+    if isLogsHTML(myFile):
+      self.loadLogsFromHTML(myFile,logs)
     else:
       self.loadLogsFromCSV(myFile)
 
@@ -654,58 +1822,39 @@ class GCAnimation:
 
     print ("Number of tracks:", len(self.tracks))
 
-  def loadLogsFromHTML(self,myHTML):
+  def loadLogsFromHTML(self,myHTML,logs=None):
 
-    print ('Processing HTML logs file:', myHTML)
+    # logs are the (log type, date, guid) records of the page if already read
 
-    logs = {}
+    print ('Processing HTML logs file:', myHTML)
 
-    fInput = open(myHTML,'r',encoding="utf8")
+    if logs is None:
+      logs = readLogsFromHTML(myHTML)
 
-    searching = 0
     nbLogs = 0
-
-    # parsing HTML to find earch log entry
-    l = fileFindNext(fInput,'<table class="Table">')
-    while l != '':
-      l = fileFindNext(fInput,"<tr")
-      l = fileFindNext(fInput,"<img")
-      type = re.sub('.*alt="','',l.strip())
-      type = re.sub('".*','',type)
+    nbVisits = 0
+    nbUnknown = 0
+    for (type,dateString,guid) in logs:
       nbLogs += 1
-      l = fileFindNext(fInput,"<td>")
-      l = fileFindNext(fInput,"<td>")
-      if re.search('</TD',l,re.IGNORECASE):
-        dateString = re.sub('.*<(TD|td)> *','',l)
-        dateString = re.sub(' .*','',dateString)
-        dateString = dateString.strip()
-      else:
-        dateString = fInput.readline().strip()
-      cacheTime = self.convertDate(dateString)
-      l = fileFindNext(fInput,"<a")
-      guid = re.sub('.*guid=','',l.strip())
-      guid = re.sub('".*','',guid)
 
       # keeping visits to cache location
       if type in ['Found it','Didn\'t find it','Attended','Owner Maintenance']:
+        cacheTime = self.convertDate(dateString)
         try:
-          print (self.guids[guid])
           (name, lat,lon) = self.guids[guid]
-          self.newItem(name,lat,lon,TRACK,cacheTime)
-          self.newItem(name,lat,lon,TRACK,cacheTime)
-
-          #try:
-          #  # reverse order for each day
-          #  logs[cacheTime].insert(0,(float(lat),float(lon)))
-          #except:
-          #  logs[cacheTime] = [(float(lat),float(lon))]
-          print (":", name, lat, lon, type)
-        except:
-          print (": ", "unknown cache or outside zone", guid)
-      else:
+        except KeyError:
+          nbUnknown += 1
+          if verbose: print (": ", "unknown cache or outside zone", guid)
+          continue
+        self.newItem(name,lat,lon,TRACK,cacheTime)
+        self.newItem(name,lat,lon,TRACK,cacheTime)
+        nbVisits += 1
+        if verbose: print (":", name, lat, lon, type)
+      elif verbose:
         print (" --- ", type)
 
     print ('  Logs loaded from HTML :',nbLogs)
+    print ('  Visits to caches :',nbVisits,'(unknown or outside zone :',nbUnknown,')')
 
     #self.tracks.append(logs)
     #self.tracksCoords.append((0.0,0.0))
@@ -713,179 +1862,277 @@ class GCAnimation:
     return
 
 
-  def loadFromCSV(self,myCSV,geocacher=None):
+  def loadFromCSV(self,myCSV):
 
     # Fields included in the GSAK view used to export to CSV
     #   Code,Cache Type,Note,Last4Logs,Last Log,Waypoint Name,Placed By,Placed,Last Found,Found,Country,Lat,Lon,Status,Url,Found by me,Owner Id
+    # columns are found by name using the header line (other columns are ignored)
+    # or by position if the header is not recognized (e.g. French version of GSAK)
+    #
+    # the file is cut in chunks of lines read by a pool of csvProcesses processes,
+    # the results of the chunks are applied in the order of the file
 
     print ('Processing CSV file:', myCSV)
 
-    fInput = open(defaultPath(myCSV,cachesDir),'r')
+    fileName = defaultPath(myCSV,cachesDir)
+    columns = dict((c,i) for (i,c) in enumerate(csvColumns))
+    with open(fileName,'r',newline='') as fInput:
+      fields = next(csv.reader([fInput.readline()]),[])
+    if len(fields) > 0 and (fields[0] == "Code GC" or fields[0] == "Code"):
+      for (i,c) in enumerate(fields):
+        if c in columns:
+          columns[c] = i
+      if verbose: print ("= HEADER =",fields)
+      missing = [c for c in csvUsedColumns if c not in fields]
+      if len(missing) == len(csvUsedColumns):
+        print ("  Header not recognized, columns taken at their default position")
+      elif missing:
+        print ("  Columns missing in the header, taken at their default position:",', '.join(missing))
+
+    if self.polygons != [] and self.polygonIndex is None:
+      self.polygonIndex = PolygonIndex(self.polygons)
+    reader = CSVChunkReader(columns,self.ingestFilter,self.polygonIndex,verbose)
+    if self.delta:
+      reader.cacheStates = self.cacheStates
 
-    if geocacher != None:
-      geocacher = geocacher.upper()
     self.nAddedEvents = 0
-    l = fInput.readline()
-    while l != '':
-      fields = re.sub('[\n\r]*','',l)
-      fields = re.sub('\|','&#108;',fields)      # cache names containing character |
-      fields = re.sub('","','|',fields[1:-1])    # getting rid of all double quotes used by GSAK
-      fields = fields.split("|")
+    if self.delta:
+      # rows of the file and changed caches, to place the new events
+      (self.updateRows,self.updateChanged) = ([],set())
+      updateStart = len(self.events)
+    chunks = csvChunks(fileName)
+    if csvProcesses > 1 and len(chunks) > 1 and not self.delta:
+      print ('  Parallel loading:',len(chunks),'chunks,',csvProcesses,'processes')
+      pool = multiprocessing.Pool(csvProcesses,initCSVWorker,(reader,))
       try:
-        (name,cacheType,note,last4logs,dateLastLog,wpName,placedBy,datePlaced,dateLastFound,found,country,latitude,longitude,status,url,dateFoundByMe,ownerId) = fields[0:17]
-      except Exception as msg:
-        print ("Problem in CSV", msg, fields)
-        break
+        for operations in pool.imap(readCSVWorkerChunk,chunks):
+          self.applyCSVOperations(operations)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      for chunk in chunks:
+        self.applyCSVOperations(reader.read(*chunk))
+    if self.delta:
+      self.placeUpdatedEvents(self.updateRows,self.updateChanged,updateStart)
 
-      if name == "Code GC" or name == "Code" or name in self.excludedCaches:
-        # first line of headers in export file of GSAK
-        # tested for French and English
-        if verbose: print ("= EXCLUDED =",l)
-        l = fInput.readline()
+    print ('Added events:',self.nAddedEvents)
+
+
+  def placeUpdatedEvents(self,rows,changed,start):
+
+    # the new events of the changed caches (added after start) are placed between
+    # the events of the unchanged caches around them in the file, as when the
+    # timeline is built from the files
+    # only the ranks of the unchanged caches next to the changed ones are looked for
+    events = self.events
+    run = []
+    previous = 0
+    for (k,name) in enumerate(rows):
+      if name in changed:
+        n = events.numbers.get(name)
+        if n is not None:
+          if not run:
+            first = k
+          run.extend(i for i in events.cacheEvents.get(n,()) if i >= start)
         continue
-      elif currentZone[0] != '_' and country != currentZone:
-        # check if the cache in inside the country (Groundspeak field)
-        print ('!!! Pb cache outside',currentZone,':',name, country)
-        l = fInput.readline()
+      if not run:
         continue
+      ranks = events.cacheRanks(name)
+      if ranks is None:
+        continue
+      events.place(run,self.previousRank(rows,changed,first,previous),ranks[0],start)
+      (run,previous) = ([],k)
+    if run:
+      events.place(run,self.previousRank(rows,changed,first,previous),None,start)
+
+
+  def previousRank(self,rows,changed,k,limit):
+
+    # last rank of the nearest unchanged cache before the row k (down to the row limit)
+    for j in range(k-1,limit-1,-1):
+      if rows[j] not in changed:
+        ranks = self.events.cacheRanks(rows[j])
+        if ranks is not None:
+          return ranks[1]
+    return None
+
+
+  def insidePolygons(self,lats,lons):
+
+    # selection of the points inside the polygons (all points if no polygon)
+    if self.polygons == []:
+      return bytearray(b'\1')*len(lats)
+    if self.polygonIndex is None:
+      self.polygonIndex = PolygonIndex(self.polygons)
+    return self.polygonIndex.inside(lats,lons)
+
+
+  def applyCSVOperations(self,operations):
+
+    # results of the reading of a chunk of the CSV file
+    if self.delta:
+      # caches already known whose state changed: their events are replaced by the new ones
+      self.events.retract([op[1] for op in operations if op[0] == STATE_OP and op[1] in self.cacheStates])
+    for op in operations:
+      if op[0] == EVENT_OP:
+        (_,name,lat,lon,status,eventTime) = op
+        self.newItem(name,lat,lon,status,eventTime)
+      elif op[0] == GUID_OP:
+        (_,guid,name,lat,lon) = op
+        self.guids[guid] = (name,lat,lon)
+      elif op[0] == STATE_OP:
+        self.cacheStates[op[1]] = op[2]
+        if self.delta:
+          self.updateChanged.add(op[1])
+      elif op[0] == ROWS_OP:
+        self.updateRows.extend(op[1])
+      else:
+        print (*op[1:])
 
-      if verbose: print ("= TRY = ",l)
-      lat, lon = float(latitude), float(longitude)
-
-      if self.polygons != []:
-        # find if cache is inside one of the polygons
-        inside = False
-        p = 0
-        while not inside and p < len(self.polygons):
-          (latMin, latMax, lonMin, lonMax) = self.polygons[p].bbox()
-          if lat >= latMin and lat <= latMax and lon >= lonMin and lon <= lonMax:
-            inside = isInsideZone(lat, lon, self.polygons[p].wpts)
-          p += 1
-        if not inside:
-          #print'!!! Outside of zone polygon', name, latitude, longitude
-          if verbose: print ("= NOK =",l)
-          l = fInput.readline()
-          continue
 
-      if verbose: print ("= OK =",l,)
+  def loadFrontiersFromFile(self,file,status=FRONTIER):
 
-      guid = re.sub('.*guid=','',url)
-      self.guids[guid] = (name,lat,lon)
-      if cacheType == "Event Cache" or cacheType == "Cache In Trash Out Event":
-        status = EVENT                     # Event cache
-      elif status == 'X':
-        status = ARCHIVED                  # Archived
-      elif status == 'T':
-        status = UNAVAILABLE               # Temporarily unavailable
-      else:
-        status = ACTIVE                    # Active cache
+    if file[-5:].lower() == '.json' or file[-8:].lower() == '.geojson':
+      self.loadFromGeoJSON(file,status)
+    else:
+      self.loadFromGPX(file,status=status)
 
-      lat,lon = float(latitude),float(longitude)
-      if (lat > self.maxLat) or (lat < self.minLat) or \
-         (lon > self.maxLon) or (lon < self.minLon) or (currentZone[0] != '_' and country != currentZone and country != ''):
-        print ('!!! Pb point outside the drawing zone:', name, lat, lon, ' not in ', self.minLat, self.maxLat, self.minLon, self.maxLon)
-        l = fInput.readline()
-        continue
 
-      cacheTime = self.convertDate(datePlaced)
-      lastFoundTime = self.convertDate(dateLastFound)
-      lastLogTime = self.convertDate(dateLastLog)
-      foundByMeTime = self.convertDate(dateFoundByMe)
+  def loadFromGeoJSON(self,file,status=FRONTIER):
 
-      if status != EVENT:
-        # a non-event cache is active for a while after being placed
-        # uncertainty between placed date and publication date
-        # cache placed by geocacher : only work if no change in pseudos
-        if geocacher != None and re.search(geocacher,placedBy.upper()):
-          self.newItem(name,lat,lon,PLACED,cacheTime)
-          # cache placed by geocacher : only work if no change in pseudos
-          print ("Placed: "+name)
-        else:
-          self.newItem(name,lat,lon,ACTIVE,cacheTime)
-        if status != ACTIVE:
-          # the cache isn't active anymore
-          if lastLogTime == 0:
-            # 20 days : dummy date for archiving time
-            lastLogTime = cacheTime + 20*24*3600
-          self.newItem(name,lat,lon,status,lastLogTime)
-      else:
-        if geocacher != None and re.search(geocacher,placedBy.upper()):
-          self.newItem(name,lat,lon,PLACED,cacheTime)
-          # cache placed by geocacher : only work if no change in pseudos
-          print ("Placed: "+name)
-        else:
-          self.newItem(name,lat,lon,status,cacheTime)
+    # lines and polygons of the features are converted to segments
+    # only if they intersect the drawing zone
+    print ('Processing GeoJSON file:',file)
 
-      l = fInput.readline()
-    fInput.close()
+    try:
+      (nFeatures,segs) = GeoJSONParser.loadSegments(defaultPath(file,frontieresDir),
+                                                    self.YMinLat,self.YMaxLat,self.XMinLon,self.XMaxLon)
+    except Exception as msg:
+      print ("Problem reading GeoJSON file",msg)
+      return
+
+    print ('  Features found :',nFeatures)
+    print ('  Segments inside the zone :',len(segs))
+    self.addSegments(segs,status)
 
-    print ('Added events:',self.nAddedEvents)
 
   def loadFromGPX(self,file,status=ACTIVE):
 
     print ('Processing GPX file:',file)
 
+    if (status == FRONTIER or status == POLYGON) and compiledFrontiers:
+      # segments of frontiers are read from the compiled file if it is up to date
+      segs = GPXParser.loadSegments(defaultPath(file,frontieresDir))
+      if segs is not None:
+        print ('  Segments found in compiled file :',len(segs))
+        self.addSegments(segs,status)
+        return
+
+    # waypoints and tracks are processed one at a time while the file is read
+    # so that large pocket queries are ingested with a bounded memory
+    self.foundWpts = {}
+    self.nAddedEvents = 0
+    nWpts, nTrcks = 0, 0
+    segs = []
+    pending = []
     try:
-      myGPX = GPXParser.GPXParser(defaultPath(file,frontieresDir))
+      myGPX = GPXParser.GPXParser(defaultPath(file,frontieresDir),materialize=False)
+      accept, acceptWaypoint = None, None
+      if status != FRONTIER and status != POLYGON and self.ingestFilter.selective():
+        # excluded caches, types and dates are checked before building the waypoints
+        accept, acceptWaypoint = self.ingestFilter.acceptElement, self.ingestFilter.acceptWaypoint
+      for p in myGPX.stream(accept,acceptWaypoint):
+        if isinstance(p,GPXParser.GPXTrack):
+          nTrcks += 1
+          if status == FRONTIER or status == POLYGON:
+            segs.extend(p.segs)
+        else:
+          nWpts += 1
+          if status != FRONTIER and status != POLYGON:
+            pending.append(p)
+            if len(pending) >= polygonBatch:
+              self.loadGPXWaypoints(pending,status)
+              pending = []
+      self.loadGPXWaypoints(pending,status)
     except Exception as msg:
       print ("Problem reading GPX file",msg)
       return
 
-    print ('  Waypoints found :',len(myGPX.wpts))
-    print ('  Tracks found :',len(myGPX.trcks))
-
+    print ('  Waypoints found :',nWpts)
+    print ('  Tracks found :',nTrcks)
     if status == FRONTIER or status == POLYGON:
-      for t in myGPX.trcks:
-        for s in t.segs:
-            self.frontiers.append(s)
-            if status == POLYGON:
-              self.polygons.append(s)
-      return
+      self.addSegments(segs,status)
+      if compiledFrontiers:
+        try:
+          GPXParser.saveSegments(defaultPath(file,frontieresDir),segs)
+        except Exception as msg:
+          print ("Problem writing compiled file",msg)
+    else:
+      print ('Added events',self.nAddedEvents)
+      print ('Caches :',len(self.foundWpts))
 
-    self.foundWpts = {}
-    self.nAddedEvents = 0
 
-    for p in myGPX.wpts:
-      name =  p.attribs['name']
-      if (name[0:2] != 'GC'):
-          continue
-      lat,lon = p.lat,p.lon
+  def addSegments(self,segs,status):
 
-      try:
-        country = p.attribs['groundspeak:country']
-      except:
-        country = ''
+    for s in segs:
+      self.frontiers.append(s)
+      if status == POLYGON:
+        self.polygons.append(s)
+        self.polygonIndex = None
 
-      if (lat > self.maxLat) or (lat < self.minLat) or \
-         (lon > self.maxLon) or (lon < self.minLon):
-        print ('!!! Pb point outside the drawing area :', p.attribs['name'], lat, lon, ' not in ', self.minLat, self.maxLat, self.minLon, self.maxLon)
-        continue
 
-      strTime = p.attribs['time']
-      strTime = re.sub('\..*','',strTime)
-      strTime = re.sub('Z$','',strTime)
-      cacheTime = int(time.mktime(time.strptime(strTime, "%Y-%m-%dT%H:%M:%S")))
+  def loadGPXWaypoints(self,wpts,status):
 
-      if p.attribs['type'] == 'Geocache|Event Cache' or p.attribs['type'] == 'Geocache|Cache In Trash Out Event':
-        cacheStatus = EVENT
-      else:
-        cacheStatus = status
-      if cacheStatus == ACTIVE:
+    # waypoints are tested against the polygons by batches
+    inside = self.insidePolygons(array.array('d',[p.lat for p in wpts]),array.array('d',[p.lon for p in wpts]))
+    for k in range(len(wpts)):
+      if inside[k]:
         try:
-          result = self.foundWpts[name]
-          # cache already listed as inactive, don't activate it
-        except:
-          self.foundWpts[name] = cacheStatus
-      else:
-          self.foundWpts[name] = cacheStatus
-      self.newItem(name,lat,lon,cacheStatus,cacheTime)
-    print ('Added events',self.nAddedEvents)
-    print ('Caches :',len(self.foundWpts))
+          self.loadGPXWaypoint(wpts[k],status)
+        except (KeyError,ValueError) as msg:
+          # a waypoint without time or type doesn't stop the reading of the file
+          print ("Problem with waypoint",wpts[k].attribs.get('name',''),msg)
+      elif verbose:
+        print ("= NOK =",wpts[k].attribs.get('name',''))
+
 
+  def loadGPXWaypoint(self,p,status):
 
-  def generateText(self,img,cacheTime):
+    name = p.attribs.get('name','')
+    if (name[0:2] != 'GC'):
+        return
+    lat,lon = p.lat,p.lon
 
-    self.imTempDraw = ImageDraw.Draw(img)
+    try:
+      country = p.attribs['groundspeak:country']
+    except:
+      country = ''
+
+    if not self.ingestFilter.insideZone(lat,lon):
+      print ('!!! Pb point outside the drawing area :', p.attribs['name'], lat, lon, ' not in ', self.minLat, self.maxLat, self.minLon, self.maxLon)
+      return
+
+    cacheTime = parseGPXTime(p.attribs['time'])
+
+    if p.attribs['type'] == 'Geocache|Event Cache' or p.attribs['type'] == 'Geocache|Cache In Trash Out Event':
+      cacheStatus = EVENT
+    else:
+      cacheStatus = status
+    if cacheStatus == ACTIVE:
+      try:
+        result = self.foundWpts[name]
+        # cache already listed as inactive, don't activate it
+      except:
+        self.foundWpts[name] = cacheStatus
+    else:
+        self.foundWpts[name] = cacheStatus
+    self.newItem(name,lat,lon,cacheStatus,cacheTime)
+
+
+  def frameTexts(self,cacheTime):
+
+    # lines of text at the bottom of a frame: list of (position, text)
     text = time.strftime("%d/%m/%Y : ",time.localtime(cacheTime))
     text += "%5d cache"%self.nCaches
     if self.nCaches > 1:
@@ -895,7 +2142,7 @@ class GCAnimation:
       if self.nCaches > 1:
         text += "s"
     if self.geocacher:
-      self.imTempDraw.text((40,self.LY-83), text, font=self.fontFixed, fill=self.foreground)
+      texts = [((40,self.LY-83), text)]
       text = self.geocacher + " : "+ ("%d"%self.nPlaced)+u" création"
       if self.nPlaced > 1:
         text += "s"
@@ -904,36 +2151,82 @@ class GCAnimation:
         text  += "s"
       if self.distance > 0:
         text += " - %.0f kms"%self.distance
-      self.imTempDraw.text((40,self.LY-43), text, font=self.fontFixed, fill=self.foreground)
+      texts.append(((40,self.LY-43), text))
     else:
-      self.imTempDraw.text((40,self.LY-43), text, font=self.fontFixed, fill=self.foreground)
+      texts = [((40,self.LY-43), text)]
+    return texts
 
 
-  def generateFlash(self,LX,LY,nDays,cacheTime):
+  def generateText(self,img,cacheTime,texts=None):
 
-    box = self.imResult.crop((0,0,self.LX,self.LY))
-    self.imTemp = Image.new('RGB',(self.LX,self.LY),self.background)
-    self.imTemp.paste(box,(0,0,self.LX,self.LY))
-
-    for status in range(0,2):
-      for i in range(0,self.flashLength):
-        for (dx,dy) in self.flashAnimation[status][(i-self.flashCursor)%self.flashLength]:
-          for (x,y) in self.flashList[status][i]:
-            try:
-              self.imTemp.putpixel((x+dx,y+dy),self.flashColor[status]) # yellow flash: cache activation, purple one for archiving
-            except:
-              print ('!!! Problem writing pixel', x+dx, y+dy, nDays, time.asctime(time.localtime(cacheTime)))
+    # the lines of text are drawn from the masks of their characters
+    for (position,text) in texts if texts is not None else self.frameTexts(cacheTime):
+      self.textStrip.draw(img,position,text,self.foreground)
 
-    # next step of the animation of the flash
-    self.flashCursor = (self.flashCursor - 1) % self.flashLength
-    for status in range(0,2):
-      self.flashList[status][self.flashCursor] = []
 
-    self.generateText(self.imTemp,cacheTime)
+  def generateFlash(self,LX,LY,nDays,cacheTime,render=True):
 
-    self.imTemp.save(imagesDir+'map%04d.png'%nDays,"PNG")
-    sys.stdout.write('.')
-    sys.stdout.flush()
+    # render: False to only update the state of the drawing (first pass of renderFrames)
+
+    texts = self.frameTexts(cacheTime)
+    ring = self.flashRing
+    flashing = ring.flashing()
+    if reuseFrames and not flashing and not self.mapChanged and self.lastFrame is not None and self.lastFrame[1] == texts:
+      # nothing drawn and no flash since the previous frame, same texts:
+      # the previous frame is used again instead of being drawn and written
+      self.frameSources[nDays] = self.lastFrame[0]
+      if render:
+        self.frameEncoder.repeatFrame(nDays,self.lastFrame[0])
+        sys.stdout.write('.')
+        sys.stdout.flush()
+      return
+
+    (lines,boxes) = (texts,None)
+    if render and not flashing and not self.mapChanged and self.staticFrame is not None:
+      # only the texts changed since the previous frame, which had no flash either:
+      # the lines that changed are drawn again on the map in a copy of that frame
+      (image,previous) = self.staticFrame
+      changed = [(position,text) for ((position,text),(_,old)) in zip(texts,previous) if text != old]
+      boxes = [self.textStrip.box(position) for (position,text) in changed]
+      if None in boxes or len(texts) != len(previous):
+        boxes = None
+      else:
+        lines = changed
+    if boxes is not None:
+      # a copy, the previous frame may still be waiting for the encoder
+      self.imTemp = image.copy()
+      for box in boxes:
+        self.imTemp.paste(self.imResult.crop(box),box)
+    elif render:
+      self.imTemp = self.imResult.copy()
+
+      # the pixels of the flashes of a status have the same color and the masks
+      # are opaque: each flashing point is drawn with the mask of its step of the
+      # animation (clipped to the image), in any order and even several times
+      paste = self.imTemp.paste
+      for status in range(0,2):
+        color = self.flashColor[status] # yellow flash: cache activation, purple one for archiving
+        for i in range(0,ring.length):
+          stamp = self.flashStamps[status][(i-ring.cursor)%ring.length]
+          if stamp is None or ring.counts[status][i] == 0:
+            continue
+          (mask,r) = stamp
+          xs, ys = ring.xs[status][i], ring.ys[status][i]
+          for k in range(ring.counts[status][i]):
+            x, y = xs[k], ys[k]
+            paste(color,(x-r,y-r,x+r+1,y+r+1),mask)
+
+    # next step of the animation of the flash
+    ring.advance()
+
+    if render:
+      self.generateText(self.imTemp,cacheTime,lines)
+      self.frameEncoder.writeFrame(nDays,self.imTemp)
+      sys.stdout.write('.')
+      sys.stdout.flush()
+    self.staticFrame = (self.imTemp,texts) if render and not flashing else None
+    self.lastFrame = (nDays,texts) if not flashing else None
+    self.mapChanged = False
 
   def latlon2xy(self,lat,lon):
 
@@ -954,11 +2247,12 @@ class GCAnimation:
         for c in caches:
           try:
             if c[0:2] == 'GC':
-              (lat,lon) = self.coords[c]
+              (lat,lon) = self.events.coords(c)
             else:
               (lat,lon) = c
             (x,y) = self.latlon2xy(lat,lon)
             if (latOld,lonOld) != (0.0,0.0):
+              self.mapChanged = True
               draw.line([(xOld, yOld),(x,y)], self.tracksColor[i])
               if fatTrack:
                 for (dx,dy) in [(1,0), (1,1), (0,1)]:
@@ -969,6 +2263,7 @@ class GCAnimation:
             xOld,yOld = x,y
             self.tracksCoords[i] = (lat,lon)
           except:
+            if self.warnings:
               print ("Missing trackpoint", c, time.strftime('%Y/%m/%d',time.localtime(cachingTime)))
       except Exception as msg:
         pass
@@ -983,38 +2278,29 @@ class GCAnimation:
     imTemp.paste(box,(0,0,self.LX,self.LY))
     self.imResult = imTemp
 
-    times = sorted(self.allWpts.keys())
-
-    for cacheTime in times:
-      for (lat,lon,name,status) in self.allWpts[cacheTime]:
-        # x = int(self.scaleX*(lon-self.XMinLon)) # 720p
-        (x,y) = self.latlon2xy(lat,lon)
-        if not geocacher or status == PLACED:
-          self.drawPoint(status,x,y)
+    events = self.events
+    events.project(self.latlon2xy)
+    statuses, xs, ys = events.statuses, events.xs, events.ys
+    self.drawPoints([(statuses[i],xs[i],ys[i]) for i in events.sortedEvents()
+                     if not geocacher or statuses[i] == PLACED])
     if geocacher:
       fileName = 'Geocaching_'+currentZone+'_'+geocacher
     else:
       fileName = 'Geocaching_'+currentZone
     print ("Preview image : "+imagesDir+fileName+'.png')
-    self.imResult.save(imagesDir+fileName+'.png',"PNG")
+    saveImage(self.imResult,imagesDir+fileName+'.png')
 
     if len(self.tracks) != 0:
       self.drawTracks(time.time())
       print ("Preview image : "+imagesDir+fileName+'_tracks.png')
-      self.imResult.save(imagesDir+fileName+'_tracks.png',"PNG")
+      saveImage(self.imResult,imagesDir+fileName+'_tracks.png')
     self.imResult = tempImg
 
 
-  def generateImages(self, barycentre = False):
-
-    print ("Generating images")
-
-    try:
-      os.mkdir(imagesDir)
-      print ('Created directory ' + imagesDir)
-    except:
-      print ('Images in directory ' + imagesDir)
+  def drawStaticLayer(self):
 
+    # background of all the frames: returns the image of the frontiers alone
+    # and draws the logos, title and texts over them in imResult
 
     self.imResult = Image.new('RGB',(self.LX,self.LY),self.background)
 
@@ -1024,23 +2310,20 @@ class GCAnimation:
 
     for f in self.frontiers:
       xOld, yOld = 0, 0
-      for p in f.wpts:
-        (x,y) = self.latlon2xy(p.lat,p.lon)
+      for lat,lon in zip(f.lats,f.lons):
+        (x,y) = self.latlon2xy(lat,lon)
         if (xOld, yOld) != (0,0):
           imDraw.line([(xOld, yOld),(x,y)], self.cacheColor[FRONTIER])
         xOld, yOld = x, y
 
-    self.imResult.save(imagesDir+'Geocaching_'+currentZone+'_frontieres.png',"PNG")
+    imFrontiers = self.imResult.copy()
 
     if not noText:
       for (logoImage,logoX,logoY, sizeX, sizeY) in logos:
-        if (logoImage.find('/') > 0):
-          logo = Image.open(logoImage)
-        else:
-          logo = Image.open(defaultPath(logoImage,logosDir))
+        logo = Image.open(self.logoPath(logoImage))
         logo = logo.convert("RGBA")
         if logo.size[0] > sizeX or logo.size[1] > sizeY:
-          logo = logo.resize((sizeX,sizeY), PIL.Image.ANTIALIAS)
+          logo = logo.resize((sizeX,sizeY), Image.LANCZOS)
         self.imResult.paste(logo,(logoX,logoY),logo)
 
     if not noText:
@@ -1052,175 +2335,498 @@ class GCAnimation:
       for (t,x,y) in texts:
         imDraw.text((x,y), t, font=self.fontArialSmall, fill=textColor)
 
+    return imFrontiers
+
+
+  def logoPath(self,logoImage):
+
+    if (logoImage.find('/') > 0):
+      return logoImage
+    return defaultPath(logoImage,logosDir)
+
+
+  def staticLayerKey(self):
+
+    # hash of everything drawn in the static layer: zone, size, colors,
+    # points of the frontiers, logos files, title, texts and fonts
+    h = hashlib.sha1()
+    fonts = [(font.path, font.size) for font in (self.fontArial, self.fontArialSmall)]
+    h.update(repr((layerMagic, PIL.__version__, currentZone, zones[currentZone], self.LX, self.LY,
+                   self.background, self.color, self.cacheColor[FRONTIER], noText, self.title, texts, fonts)).encode('utf8'))
+    if not noText:
+      try:
+        for (logoImage,logoX,logoY, sizeX, sizeY) in logos:
+          st = os.stat(self.logoPath(logoImage))
+          h.update(repr((os.path.abspath(self.logoPath(logoImage)), logoX, logoY, sizeX, sizeY,
+                         st.st_size, st.st_mtime_ns)).encode('utf8'))
+      except OSError:
+        return None
+    for f in self.frontiers:
+      h.update(struct.pack('=q',len(f)))
+      h.update(f.lats)
+      h.update(f.lons)
+    return h.hexdigest()[:20]
+
+
+  def staticLayerFiles(self,key):
+
+    return (layersDir+'layer_'+key+'_frontieres.ppm', layersDir+'layer_'+key+'.ppm')
+
+
+  def loadStaticLayer(self,key):
+
+    (frontiersFile,layerFile) = self.staticLayerFiles(key)
+    try:
+      imFrontiers = Image.open(frontiersFile).convert('RGB')
+      imLayer = Image.open(layerFile).convert('RGB')
+    except Exception:
+      return None
+    if imFrontiers.size != (self.LX,self.LY) or imLayer.size != (self.LX,self.LY):
+      return None
+    print ('Static layer loaded from cache:',layerFile)
+    return (imFrontiers, imLayer)
+
+
+  def saveStaticLayer(self,key,imFrontiers):
+
+    # images are written uncompressed: they are read faster than they are drawn
+    try:
+      os.makedirs(layersDir,exist_ok=True)
+      for (img,fileName) in zip((imFrontiers,self.imResult),self.staticLayerFiles(key)):
+        saveImage(img,fileName+'.tmp','ppm')
+        os.replace(fileName+'.tmp',fileName)
+    except Exception as msg:
+      print ("Problem writing the static layer:",msg)
+
+
+  def drawDay(self,cacheTime,dayTimes,group):
+
+    # dots and lines of the caches of a frame (day or period) drawn in imResult
+    events = self.events
+    dArchived = 0
+    dUnavailable = 0
+    dActive = 0
+
+    self.draw = ImageDraw.Draw(self.imResult)
+
+    self.nDays = self.nDays + 1
+
+    (latOld,lonOld,xOld,yOld) = self.lastMove
+    nbStatuses = self.nbStatuses
+
+    # dots of the caches of the day, drawn by batches (before each line of a track)
+    dots = []
+    for i in group:
+      (lat,lon,status) = (events.lats[i],events.lons[i],events.statuses[i])
+      n = events.caches[i]
+      name = events.names[n]
+      (x,y) = (events.xs[i],events.ys[i])
+      # print ('Cache placed:',time.asctime(time.localtime(cacheTime)), name, (lat,lon) , (x,y))
+      if self.trackBarycentre is not None:
+        self.nbBarycentre += 1
+        self.sumLatBarycentre += lat
+        self.sumLonBarycentre += lon
+
+      if self.wptStatus[n] != status:
+        if self.wptStatus[n] >= 0:
+          nbStatuses[self.wptStatus[n]] -= 1
+        nbStatuses[status] += 1
+        self.wptStatus[n] = status
+
+      if status == UNAVAILABLE:
+        self.nUnavailable += 1
+        self.flashRing.add(1,x,y)
+      elif status == ACTIVE or status == PLACED:
+        self.nActive += 1
+        self.flashRing.add(1,x,y)
+      elif status == ARCHIVED:
+        self.nArchived += 1
+        self.flashRing.add(0,x,y)
+
+      if status == ACTIVE or status == PLACED or status == EVENT:          # active caches or events
+        self.nCaches += 1
+        if status == PLACED:
+          self.nPlaced += 1
+      try:
+        if status == TRACK or status == PLACED:                            # drawing moves of a geocacher
+          if (latOld,lonOld) != (0.0,0.0):
+            self.drawPoints(dots)
+            dots = []
+            self.mapChanged = True
+            self.draw.line([(xOld, yOld),(x,y)], self.cacheColor[TRACK])
+            if fatTrack:
+              for (dx,dy) in [(1,0), (1,1), (0,1)]:
+                self.draw.line([(xOld+dx, yOld+dy),(x+dx,y+dy)], self.cacheColor[TRACK])
+            self.distance += getDistance(latOld,lonOld,lat,lon)
+          self.nVisits += 1
+          # del draw
+          xOld,yOld = x,y
+          latOld,lonOld = lat,lon
+        if not (0 <= x < self.LX and 0 <= y < self.LY):
+          raise IndexError('image index out of range')
+        dots.append((status,x,y))
+      except Exception as msg:
+        if self.warnings:
+          print ('!!! Problem - point outside the drawing area:', lat, lon, latOld, lonOld, name, x, y, status, msg)
+    self.drawPoints(dots)
+    self.lastMove = (latOld,lonOld,xOld,yOld)
+
+    if self.trackBarycentre is not None and len(group) > 0:
+      #print (self.nbBarycentre, self.sumLatBarycentre, self.sumLonBarycentre)
+      latBarycentre = self.sumLatBarycentre/self.nbBarycentre
+      lonBarycentre = self.sumLonBarycentre/self.nbBarycentre
+      if self.fBarycentre:
+        self.fBarycentre.write('<trkpt lat="%f" lon="%f" />\n'%(latBarycentre, lonBarycentre))
+      self.tracks[self.trackBarycentre][cacheTime] = [(latBarycentre,lonBarycentre)]
+      #print (len(self.tracks[self.trackBarycentre]), latBarycentre, lonBarycentre)
+
+    if nbStatuses != self.nbStatusesPrevious:
+      dArchived    = nbStatuses[0] - self.nbStatusesPrevious[0]
+      dUnavailable = nbStatuses[1] - self.nbStatusesPrevious[1]
+      dActive      = nbStatuses[2] - self.nbStatusesPrevious[2]
+      self.nbStatusesPrevious = dict(nbStatuses)
+
+    for (i,delta) in enumerate((dArchived,dUnavailable,dActive)):
+      self.maxDeltas[i] = max(self.maxDeltas[i],delta)
+      self.minDeltas[i] = min(self.minDeltas[i],delta)
+
+    for dayTime in dayTimes:
+      self.drawTracks(dayTime)
+
+
+  # state of the drawing changed by the frames, saved at the keyframes
+  frameState = ['imResult','wptStatus','nbStatuses','nbStatusesPrevious','flashRing',
+                'tracksCoords','lastMove','mapChanged','lastFrame','nDays','nCaches','nActive',
+                'nUnavailable','nArchived','nVisits','nPlaced','distance','maxDeltas','minDeltas',
+                'sumLatBarycentre','sumLonBarycentre','nbBarycentre']
+
+  def saveState(self):
+
+    state = {}
+    for name in self.frameState:
+      if name == 'imResult':
+        state[name] = self.imResult.copy()
+      elif hasattr(self,name):
+        state[name] = copy.deepcopy(getattr(self,name))
+    return state
+
+  def restoreState(self,state):
+
+    for (name,value) in state.items():
+      setattr(self,name,value)
+    self.staticFrame = None
+
+
+  def checkpointKeys(self):
+
+    # hashes of the parameters of the frames (render key) and of the events and
+    # tracks drawn (events key): a run can be resumed if both keys are unchanged
+    # and extended with new days (-n) if the render key is unchanged
+    h = hashlib.sha1()
+    h.update(repr((checkpointMagic, self.staticLayerKey(), self.LX, self.LY, frameInterval, videoDuration,
+                   self.frameEncoder.format, pngCompressLevel, bigPixels, fatTrack, reuseFrames,
+                   self.flashAnimation, self.flashColor, self.cacheColor, self.foreground,
+                   (self.fontFixed.path, self.fontFixed.size), self.geocacher,
+                   self.tracksName, self.tracksColor)).encode('utf8'))
+    renderKey = h.hexdigest()[:20]
+    events = self.events
+    h = hashlib.sha1()
+    h.update(repr(events.names).encode('utf8'))
+    for column in (events.caches, events.statuses, events.times, events.lats, events.lons):
+      h.update(column)
+    h.update(repr(self.tracks).encode('utf8'))
+    return (renderKey, h.hexdigest()[:20])
+
+  def saveCheckpoint(self,keys,frame,lastTime,complete=False):
+
+    # state of the drawing after the first frames of the timeline (frame: number
+    # of frames of the timeline, lastTime: time of the last one), once their files are written
+    self.frameEncoder.flush()
+    barycentreSize = None
+    if self.fBarycentre:
+      self.fBarycentre.flush()
+      barycentreSize = self.fBarycentre.tell()
+    checkpoint = {'keys': keys, 'frame': frame, 'lastTime': lastTime, 'complete': complete,
+                  'names': self.events.names, 'state': self.saveState(),
+                  'frameSources': self.frameSources, 'barycentreSize': barycentreSize}
+    fileName = imagesDir+'checkpoint.bin'
+    try:
+      with open(fileName+'.tmp','wb') as f:
+        f.write(checkpointMagic)
+        pickle.dump(checkpoint,f,pickle.HIGHEST_PROTOCOL)
+      os.replace(fileName+'.tmp',fileName)
+    except (IOError,OSError) as msg:
+      print ("Problem writing the checkpoint:",msg)
+
+  def loadCheckpoint(self):
+
+    # returns None if there is no valid checkpoint
+    try:
+      with open(imagesDir+'checkpoint.bin','rb') as f:
+        if f.read(len(checkpointMagic)) != checkpointMagic:
+          return None
+        checkpoint = pickle.load(f)
+    except (IOError,OSError,EOFError,pickle.UnpicklingError,AttributeError,ImportError,ValueError,IndexError,TypeError):
+      # checkpoint written by another version of the program
+      return None
+    if not isinstance(checkpoint,dict) or \
+       any(k not in checkpoint for k in ('keys','frame','lastTime','complete','names','state','frameSources','barycentreSize')):
+      return None
+    return checkpoint
+
+  def resumeFromCheckpoint(self,keys,frames):
+
+    # restores the state of the drawing saved by a previous run and returns the
+    # number of frames of the timeline already rendered and the size of the
+    # barycentre file, or None if all the frames have to be rendered
+    checkpoint = self.loadCheckpoint()
+    if checkpoint is None or checkpoint['keys'][0] != keys[0]:
+      if extendFrames:
+        print ("No previous run with the same parameters to extend")
+      return None
+    if checkpoint['keys'] == keys and not checkpoint['complete']:
+      start = checkpoint['frame']
+      print ('Resuming the animation after frame', checkpoint['state']['nDays'])
+    elif extendFrames:
+      start = len([frame for frame in frames if frame[0] <= checkpoint['lastTime']])
+      if start < len(frames):
+        # the days of the first new period already drawn by the previous run are skipped
+        (cacheTime,dayTimes,group) = frames[start]
+        lastDayDrawn = datetime.date.fromtimestamp(checkpoint['lastTime']).toordinal()
+        times = self.events.times
+        frames[start] = (cacheTime, [t for t in dayTimes if t > checkpoint['lastTime']],
+                         [i for i in group if datetime.date.fromtimestamp(times[i]).toordinal() > lastDayDrawn])
+      print ('Extending the animation after',time.strftime('%d/%m/%Y',time.localtime(checkpoint['lastTime'])),
+             ':',len(frames)-start,'new frames')
+    else:
+      return None
+    state = checkpoint['state']
+    if checkpoint['names'] != self.events.names:
+      # statuses of the caches of the previous run, with the numbers of the new events
+      numbers = self.events.numbers
+      wptStatus = array.array('b',[-1])*len(self.events.names)
+      for (name,status) in zip(checkpoint['names'],state['wptStatus']):
+        if status >= 0 and name in numbers:
+          wptStatus[numbers[name]] = status
+      state['wptStatus'] = wptStatus
+    self.restoreState(state)
+    self.frameSources = checkpoint['frameSources']
+    return (start,checkpoint['barycentreSize'])
+
+
+  def renderFrames(self,frames):
+
+    # rendering of the frames by renderProcesses processes: the state of the
+    # drawing is saved at a keyframe every few frames during a first pass that
+    # only draws the dots and lines in imResult (the frames are neither
+    # composed nor written), then each process renders the frames of a shard
+    # starting from the state of its keyframe, as a sequential rendering would
+    if renderProcesses <= 1 or len(frames) < 2:
+      return False
+    try:
+      # the processes use a copy of the animation, only available with fork
+      context = multiprocessing.get_context('fork')
+    except ValueError:
+      print ("Parallel rendering not available, rendering the frames sequentially")
+      return False
+
+    interval = keyframeInterval or -(-len(frames) // (2*renderProcesses))
+    self.keyframes = []
+    for (k,(cacheTime,dayTimes,group)) in enumerate(frames):
+      if k % interval == 0:
+        self.keyframes.append(self.saveState())
+      self.drawDay(cacheTime,dayTimes,group)
+      self.generateFlash(self.LX,self.LY,self.nDays,cacheTime,render=False)
+    print ('  Parallel rendering:',len(frames),'frames,',len(self.keyframes),'keyframes,',renderProcesses,'processes')
+
+    # no encoding thread nor pending output when the processes are forked
+    self.frameEncoder.close()
+    sys.stdout.flush()
+    if self.fBarycentre:
+      self.fBarycentre.flush()
+
+    global renderedAnimation
+    renderedAnimation = (self,frames,interval)
+    pool = context.Pool(min(renderProcesses,len(self.keyframes)))
+    try:
+      pool.map(renderWorkerShard,range(len(self.keyframes)),1)
+    finally:
+      pool.close()
+      pool.join()
+      renderedAnimation = None
+      self.keyframes = []
+    self.frameEncoder = FrameEncoder()
+    return True
+
+  def renderShard(self,frames,shard,interval):
+
+    # frames of a shard rendered in a worker process from the state of its keyframe
+    self.restoreState(self.keyframes[shard])
+    self.fBarycentre = None    # written by the first pass
+    self.warnings = False      # already printed by the first pass
+    self.frameEncoder = FrameEncoder()
+    try:
+      for (cacheTime,dayTimes,group) in frames[shard*interval:(shard+1)*interval]:
+        self.drawDay(cacheTime,dayTimes,group)
+        self.generateFlash(self.LX,self.LY,self.nDays,cacheTime)
+    finally:
+      self.frameEncoder.close()
+
+
+  def generateImages(self, barycentre = False):
+
+    print ("Generating images")
+
+    try:
+      os.mkdir(imagesDir)
+      print ('Created directory ' + imagesDir)
+    except:
+      print ('Images in directory ' + imagesDir)
+
+
+    # frontiers, logos and texts are drawn again only if an input changed
+    layerKey = self.staticLayerKey() if cachedLayers else None
+    layer = self.loadStaticLayer(layerKey) if layerKey else None
+    if layer:
+      (imFrontiers, self.imResult) = layer
+    else:
+      imFrontiers = self.drawStaticLayer()
+      if layerKey:
+        self.saveStaticLayer(layerKey,imFrontiers)
+    saveImage(imFrontiers,imagesDir+'Geocaching_'+currentZone+'_frontieres.png')
+
     # misc counters
-    nDays = 0
+    self.nDays = 0
     self.nCaches = 0
-    nActive = 0
-    nUnavailable = 0
-    nArchived = 0
+    self.nActive = 0
+    self.nUnavailable = 0
+    self.nArchived = 0
     self.nVisits = 0            # visits of a geocacher : found, did not found
     self.nPlaced = 0            # cache placed or event organized
+    self.fBarycentre = None
     if barycentre:
       self.sumLatBarycentre = 0.0
       self.sumLonBarycentre = 0.0
       self.nbBarycentre =0
-      fBarycentre = open('barycentre.gpx','w',encoding="utf8")
 
-    # variables to display the geocacher's moves
-    latOld,lonOld = 0.0,0.0
-    xOld,yOld = 0,0
+    # variables to display the geocacher's moves: latOld,lonOld,xOld,yOld
+    self.lastMove = (0.0,0.0,0,0)
     self.distance = 0
 
-    maxArchived, minArchived = 0, 0
-    maxUnavailable, minUnavailable = 0, 0
-    maxActive, minActive = 0, 0
+    # extreme daily variations of the numbers of archived, unavailable and active caches
+    self.maxDeltas = [0,0,0]
+    self.minDeltas = [0,0,0]
 
-    nbStatuses = { ACTIVE: 0, UNAVAILABLE: 0, ARCHIVED: 0, EVENT:0, TRACK:0, PLACED: 0}
-    nbStatusesPrevious = dict(nbStatuses)
+    self.nbStatuses = { ACTIVE: 0, UNAVAILABLE: 0, ARCHIVED: 0, EVENT:0, TRACK:0, PLACED: 0}
+    self.nbStatusesPrevious = dict(self.nbStatuses)
 
     self.generatePreview()
     if geocacher:
       self.generatePreview(self.geocacher+"_")
 
-    cacheTimes = sorted(self.allWpts.keys())
+    # with a duration of the video (-s option), the number of days of each frame follows the activity
+    nFrames = None
+    if videoDuration and not printing:
+      nFrames = max(1, int(videoDuration*videoFps) - leadingFrames - tailFrames)
+    timeline = Timeline(self.events,frameInterval,nFrames,lastDay)
+    if nFrames and len(timeline) > 0:
+      nDays = timeline.starts[-1] - timeline.firstDay
+      print ('Timeline:',nDays,'days in',len(timeline),'frames (%.1f days by frame)'%(nDays/len(timeline)))
 
-    if len(cacheTimes) == 0:
+    if len(timeline) == 0:
       return
 
-    # generate the first image without any cache
-    self.generateFlash(self.LX,self.LY,nDays,cacheTimes[0])
-
-    # initialize the time of the current frame to the first date
-    previousTime = cacheTimes[0]
-
+    self.trackBarycentre = None
     if barycentre:
       self.tracks.append({})
       self.tracksCoords.append((0.0,0.0))
       self.tracksName.append('Barycentre')
       self.tracksColor.append(self.cacheColor[BARYCENTRE])
-      trackBarycentre = len(self.tracks) - 1
+      self.trackBarycentre = len(self.tracks) - 1
       print ("Number of tracks with barycentre:" , len(self.tracks))
       
-    for cacheTime in cacheTimes:
+    events = self.events
+    events.project(self.latlon2xy)
+    self.wptStatus = array.array('b',[-1])*len(events.names)
+
+    # one frame for each calendar day (or period of frameInterval days)
+    frames = []
+    for (cacheTime,dayTimes,group) in timeline:
       # don't display future dates corresponding to future events
       if cacheTime > lastDay+86400:
           cacheTime = lastDay
           break
+      frames.append((cacheTime,dayTimes,group))
+    endTime = cacheTime
 
-      dArchived = 0
-      dUnavailable = 0
-      dActive = 0
-
-      # print (time.asctime(time.localtime(cacheTime)))
-      # generate intermediate images for each days between last cache day and current day
-      for cachingTime in range(previousTime+24*3600, cacheTime, 24*3600):
-          nDays= nDays + 1
-          self.drawTracks(cachingTime)
-          if not printing:
-            self.generateFlash(self.LX,self.LY,nDays,cachingTime)
-
-      self.draw = ImageDraw.Draw(self.imResult)
-
-      nDays = nDays + 1
+    # frames are encoded in other threads while the next ones are drawn
+    if videoFile:
+      print ("Video stream:",videoFile)
+      self.frameEncoder = VideoEncoder(videoFile)
+    else:
+      self.frameEncoder = FrameEncoder()
 
-      for (lat,lon,name,status) in self.allWpts[cacheTime]:
-        # x = int(self.scaleX*(lon-self.XMinLon)) # 720p
-        (x,y) = self.latlon2xy(lat,lon)
-        # print ('Cache placed:',time.asctime(time.localtime(cacheTime)), name, (lat,lon) , (x,y))
-        if barycentre:
-          self.nbBarycentre += 1
-          self.sumLatBarycentre += lat
-          self.sumLonBarycentre += lon
+    # the drawing is resumed from the checkpoint of an interrupted run,
+    # or continued after the last day of the previous run (-n option)
+    keys = None
+    resumed = None
+    if not printing and not self.frameEncoder.repeatsFrames:
+      keys = self.checkpointKeys()
+      resumed = self.resumeFromCheckpoint(keys,frames)
+    start = resumed[0] if resumed else 0
 
-        try:
-          if self.wptStatus[name] != status:
-            nbStatuses[self.wptStatus[name]] -= 1
-            nbStatuses[status] += 1
-            self.wptStatus[name] = status
-        except:
-          self.wptStatus[name] = status
-          nbStatuses[status] += 1
-
-        if status == UNAVAILABLE:
-          nUnavailable += 1
-          self.flashList[1][self.flashCursor].append((x,y))
-        elif status == ACTIVE or status == PLACED:
-          nActive += 1
-          self.flashList[1][self.flashCursor].append((x,y))
-        elif status == ARCHIVED:
-          nArchived += 1
-          self.flashList[0][self.flashCursor].append((x,y))
-
-        if status == ACTIVE or status == PLACED or status == EVENT:          # active caches or events
-          self.nCaches += 1
-          if status == PLACED:
-            self.nPlaced += 1
-        try:
-          if status == TRACK or status == PLACED:                            # drawing moves of a geocacher
-            if (latOld,lonOld) != (0.0,0.0):
-              self.draw.line([(xOld, yOld),(x,y)], self.cacheColor[TRACK])
-              if fatTrack:
-                for (dx,dy) in [(1,0), (1,1), (0,1)]:
-                  self.draw.line([(xOld+dx, yOld+dy),(x+dx,y+dy)], self.cacheColor[TRACK])
-              self.distance += getDistance(latOld,lonOld,lat,lon)
-            self.nVisits += 1
-            # del draw
-            xOld,yOld = x,y
-            latOld,lonOld = lat,lon
-          self.drawPoint(status,x,y)
-        except Exception as msg:
-          print ('!!! Problem - point outside the drawing area:', lat, lon, latOld, lonOld, name, x, y, status, msg)
-
-      if barycentre:
-        #print (self.nbBarycentre, self.sumLatBarycentre, self.sumLonBarycentre)
-        latBarycentre = self.sumLatBarycentre/self.nbBarycentre
-        lonBarycentre = self.sumLonBarycentre/self.nbBarycentre
-        fBarycentre.write('<trkpt lat="%f" lon="%f" />\n'%(latBarycentre, lonBarycentre))
-        self.tracks[trackBarycentre][cacheTime] = [(latBarycentre,lonBarycentre)]
-        #print (len(self.tracks[trackBarycentre]), latBarycentre, lonBarycentre)
-
-      if nbStatuses != nbStatusesPrevious:
-        dArchived    = nbStatuses[0] - nbStatusesPrevious[0]
-        dUnavailable = nbStatuses[1] - nbStatusesPrevious[1]
-        dActive      = nbStatuses[2] - nbStatusesPrevious[2]
-        nbStatusesPrevious = dict(nbStatuses)
-
-      maxArchived = max(maxArchived,dArchived)
-      maxUnavailable = max(maxUnavailable,dUnavailable)
-      maxActive = max(maxActive,dActive)
-      minArchived = min(minArchived,dArchived)
-      minUnavailable = min(minUnavailable,dUnavailable)
-      minActive = min(minActive,dActive)
-
-      self.drawTracks(cacheTime)
-      if not printing:
-        self.generateFlash(self.LX,self.LY,nDays,cacheTime)
-
-      previousTime = cacheTime
-
-    # display the final situation during a few seconds
-    if not printing:
-      for i in range(nDays,nDays+100):
-        self.generateFlash(self.LX,self.LY,i,cacheTime)
+    if barycentre:
+      if resumed and resumed[1] is not None and os.path.isfile('barycentre.gpx'):
+        # the points of the frames already rendered are kept
+        self.fBarycentre = open('barycentre.gpx','r+',encoding="utf8")
+        self.fBarycentre.seek(resumed[1])
+        self.fBarycentre.truncate()
+      else:
+        self.fBarycentre = open('barycentre.gpx','w',encoding="utf8")
+
+    if not resumed:
+      # generate the first image without any cache
+      self.generateFlash(self.LX,self.LY,self.nDays,timeline.firstTime())
+      if self.frameEncoder.repeatsFrames and not printing:
+        self.frameEncoder.repeatLastFrame(leadingFrames)
+
+    if printing or self.frameEncoder.repeatsFrames or not self.renderFrames(frames[start:]):
+      for k in range(start,len(frames)):
+        (cacheTime,dayTimes,group) = frames[k]
+        self.drawDay(cacheTime,dayTimes,group)
+        if not printing:
+          self.generateFlash(self.LX,self.LY,self.nDays,cacheTime)
+        if keys and checkpointInterval > 0 and (k+1) % checkpointInterval == 0 and k+1 < len(frames):
+          self.saveCheckpoint(keys,k+1,cacheTime)
+    if keys and len(frames) > 0:
+      # state before the still frames, used to extend the animation
+      self.saveCheckpoint(keys,len(frames),frames[-1][0],complete=True)
+    nDays = self.nDays
+
+    # display the final situation during a few seconds: the last frame is repeated
+    # as it is (listed again in listPNG.txt for the PNG frames)
+    if not printing and self.frameEncoder.repeatsFrames:
+      self.frameEncoder.repeatLastFrame(tailFrames-1)
+    self.frameEncoder.close()
 
     if self.printing:
-      cacheTime = lastDay
-    self.generateText(self.imResult,cacheTime)
+      endTime = lastDay
+    self.generateText(self.imResult,endTime)
     draw = ImageDraw.Draw(self.imResult)
     for (cache,size,color) in showCaches:
       print ("Showing special cache:",cache)
       try:
-        (lat,lon) = self.coords[cache]
+        (lat,lon) = self.events.coords(cache)
         (x, y) = self.latlon2xy(lat,lon)
         draw.ellipse((x-size,y-size,x+size,y+size), fill=color)
       except:
         pass
 
-    if barycentre:
-      fBarycentre.close()
+    if self.fBarycentre:
+      self.fBarycentre.close()
 
     # final view of all caches
-    self.imResult.save(imagesDir+'Geocaching_'+currentZone+'.png',"PNG")
+    saveImage(self.imResult,imagesDir+'Geocaching_'+currentZone+'.png')
 
     print ("Global view:",imagesDir+'Geocaching_'+currentZone+'.png')
 
@@ -1229,20 +2835,21 @@ class GCAnimation:
 
     print ('')
     print ('Processed ', self.nCaches, 'caches')
-    print ('Processed ', nActive, 'active caches')
-    print ('Processed ', nUnavailable, 'unavailable caches')
-    print ('Processed ', nArchived, 'archived caches')
+    print ('Processed ', self.nActive, 'active caches')
+    print ('Processed ', self.nUnavailable, 'unavailable caches')
+    print ('Processed ', self.nArchived, 'archived caches')
 
-    if not printing:
+    if not printing and not videoFile:
+      ext = self.frameEncoder.format
       fOut = open(imagesDir+'listPNG.txt','w')
-      for i in range(0,50):
+      for i in range(0,leadingFrames):
         # fill some images at the beginning
-        fOut.write('map0000.png\n')
+        fOut.write('map0000.%s\n'%ext)
       for i in range(0,nDays+1):
-        fOut.write('map%04d.png\n'%i)
-      for i in range(nDays+1,nDays+100):
+        fOut.write('map%04d.%s\n'%(self.frameSources.get(i,i),ext))
+      for i in range(nDays+1,nDays+tailFrames):
         # some still frames to finish the video
-        fOut.write('map%04d.png\n'%nDays)
+        fOut.write('map%04d.%s\n'%(self.frameSources.get(nDays,nDays),ext))
       fOut.close()
 
 if __name__=='__main__':
@@ -1251,16 +2858,25 @@ if __name__=='__main__':
     print ('Usage: python generationAnimation.py <active_caches.gpx>')
     print ('Usage: python generationAnimation.py <gsak_extract.csv> [ <name of geocacher> ]')
     print ('-g <geocacher name> : display activity of the geocacher')
-    print ('-f <frontier gpx file> : display the frontiers or coastlines')
-    print ('-i <polygon gpx file> : display points inside the polygon')
+    print ('-f <frontier gpx or geojson file> : display the frontiers or coastlines')
+    print ('-i <polygon gpx or geojson file> : display points inside the polygon')
     print ('-l <logged caches file> : process "all logs" HTML file')
     print ('-z <zone> : restrict display to zone')
     print ('-x <file of cache ids> : exclude the caches from the animation')
+    print ('-t <cache types> : only display the caches of the types (separated by commas)')
+    print ('-d <first date>,<last date> : only display the caches placed between the dates (dd/mm/yyyy)')
     print ('-p : printing')
     print ('-c <color>: background color (white or black)')
     print ('-a <archived_caches.gpx>: list of cache that are now archived')
     print ('-v : verbose mode to list the status of the caches')
     print ('-b : display barycentre of caches')
+    print ('-u : update the last compiled timeline with the changes of the caches files')
+    print ('-s <seconds> : duration of the animation, the number of days of each frame follows the activity')
+    print ('-n : extend the frames of the previous run with the days after its last day')
+    print ('-j <processes> : number of processes reading the CSV and HTML logs files')
+    print ('-r <processes> : number of processes rendering the frames')
+    print ('-e <format> : format of the frames: png, png:<compression level 0-9>, ppm, tga or qoi')
+    print ('-o <video file> : write the frames in a video stream (.y4m, .rgb for raw RGB, - for stdout) instead of PNG files')
     print ('<caches file> : CSV table of caches')
     print ('')
     print ('Note : some arguments can be used multiple times (-f, -l, etc...)')
@@ -1273,17 +2889,18 @@ if __name__=='__main__':
   printing = False
   verbose = False
   barycentre = False
+  update = False
   archived = []
   frontiers = []
   polygons = []
   logs = []
   excludeCaches = None
   excludedCaches = []
-
-  print (sys.argv[1:])
+  cacheTypes = []
+  firstDate, lastDate = None, None
 
   try:
-    opts, args = getopt.getopt(sys.argv[1:],"hbpva:c:f:g:i:l:x:z:")
+    opts, args = getopt.getopt(sys.argv[1:],"hbnpuva:c:d:e:f:g:i:j:l:o:r:s:t:x:z:")
   except getopt.GetoptError:
     usage()
 
@@ -1303,6 +2920,29 @@ if __name__=='__main__':
     elif opt == "-b":
       # display barycentre of caches
       barycentre = True
+    elif opt == "-u":
+      # update the compiled timeline with a new export of the caches
+      update = True
+    elif opt == "-s":
+      # duration of the video: several days by frame when there is little activity
+      videoDuration = float(arg)
+    elif opt == "-n":
+      # only render the new days after the previous run
+      extendFrames = True
+    elif opt == "-j":
+      # read the CSV files with several processes
+      csvProcesses = max(1,int(arg))
+    elif opt == "-r":
+      # render the frames with several processes
+      renderProcesses = max(1,int(arg))
+    elif opt == "-e":
+      # format of the frames (and compression level of PNG)
+      (frameFormat, _, level) = arg.lower().partition(':')
+      if level != '':
+        pngCompressLevel = min(9,max(0,int(level)))
+    elif opt == "-o":
+      # stream the frames to a video file, a pipe or stdout
+      videoFile = arg
     elif opt == "-c":
       # choos the main background color (black ou <)
       color = arg
@@ -1321,6 +2961,17 @@ if __name__=='__main__':
     elif opt in ("-z", "--zone"):
       # use the template to display the named zone (scale and offset)
       currentZone = arg
+    elif opt in ("-t", "--types"):
+      # only display some types of caches
+      cacheTypes.extend([t.strip() for t in arg.split(',') if t.strip() != ''])
+    elif opt in ("-d", "--dates"):
+      # only display caches placed between the two dates (each one is optional)
+      (first, _, last) = arg.partition(',')
+      firstDate = parseDate(first.strip()) if first.strip() != '' else None
+      lastDate = parseDate(last.strip()) if last.strip() != '' else None
+      if firstDate == 0 or lastDate == 0:
+        print ('Unknown date format:',arg)
+        usage()
     elif opt in ("-x", "--exclude"):
       # exclude a list of caches (when the region is wrong)
       excludeCaches = arg
@@ -1328,7 +2979,11 @@ if __name__=='__main__':
       # load a file containing the logs of a cacher to display the moves
       logs.append(arg)
 
-  myAnimation = GCAnimation(currentZone,printing,color,excludedCaches)
+  if videoFile == '-':
+    # the video is written on stdout: messages are written on stderr
+    sys.stdout = sys.stderr
+
+  print (sys.argv[1:])
 
   if excludeCaches and os.path.isfile(excludeCaches):
     with open(defaultPath(excludeCaches,cachesDir),'r') as f:
@@ -1336,22 +2991,71 @@ if __name__=='__main__':
         excludedCaches.append(x.strip())
   print (excludedCaches)
 
+  # selection of the caches, applied while reading the files
+  ingestFilter = IngestFilter(currentZone,excludedCaches,geocacher,cacheTypes,firstDate,lastDate)
+
+  myAnimation = GCAnimation(currentZone,printing,color,ingestFilter)
+
   for file in frontiers:
-    myAnimation.loadFromGPX(defaultPath(file,frontieresDir),status=FRONTIER)
+    myAnimation.loadFrontiersFromFile(defaultPath(file,frontieresDir),status=FRONTIER)
 
   for file in polygons:
-    myAnimation.loadFromGPX(defaultPath(file,frontieresDir),status=POLYGON)
+    myAnimation.loadFrontiersFromFile(defaultPath(file,frontieresDir),status=POLYGON)
+
+  # events of the caches are taken from the compiled timeline if the inputs are unchanged
+  # or, with -u, from the last compiled timeline of the same files updated with the changes
+  timelineFile = None
+  if compiledTimelines or update:
+    try:
+      (baseKey,key) = timelineKeys([(defaultPath(f,frontieresDir),POLYGON) for f in polygons] +
+                                   [(defaultPath(f,cachesDir),ACTIVE) for f in args] +
+                                   [(defaultPath(f,cachesDir),ARCHIVED) for f in archived],
+                                   ingestFilter)
+      timelineFile = timelinesDir+'timeline_'+baseKey+'_'+key+'.bin'
+    except OSError as msg:
+      print ("Problem with the inputs of the timeline:",msg)
+
+  previousFiles = []
+  if timelineFile and update:
+    previousFiles = sorted(glob.glob(timelinesDir+'timeline_'+baseKey+'_*.bin'), key=os.path.getmtime)
+
+  if timelineFile and myAnimation.loadTimeline(timelineFile,key):
+    myAnimation.setGeocacher(geocacher)
+  elif previousFiles and myAnimation.loadTimeline(previousFiles[-1],previousFiles[-1][-24:-4]):
+    myAnimation.delta = True
+    for file in args:
+      print ("Updating with file:", file)
+      myAnimation.loadFromFile(defaultPath(file,cachesDir),geocacher)
+
+    for file in archived:
+      print ("Updating with archived file", file)
+      myAnimation.loadFromFile(defaultPath(file,cachesDir),geocacher,status=ARCHIVED)
+    # events in the order of the files, even if the timeline can't be written
+    myAnimation.events.compact()
+
+    try:
+      myAnimation.saveTimeline(timelineFile,key)
+    except Exception as msg:
+      print ("Problem writing the compiled timeline:",msg)
+  else:
+    for file in args:
+      print ("Loading file:", file)
+      myAnimation.loadFromFile(defaultPath(file,cachesDir),geocacher)
 
-  for file in args:
-    print ("Loading file:", file)
-    myAnimation.loadFromFile(defaultPath(file,cachesDir),geocacher)
+    for file in archived:
+      print ("Loading archived file", file)
+      myAnimation.loadFromFile(defaultPath(file,cachesDir),geocacher,status=ARCHIVED)
 
-  for file in archived:
-    print ("Loading archived file", file)
-    myAnimation.loadFromFile(defaultPath(file,cachesDir),geocacher,status=ARCHIVED)
+    if timelineFile:
+      try:
+        myAnimation.saveTimeline(timelineFile,key)
+      except Exception as msg:
+        print ("Problem writing the compiled timeline:",msg)
 
+  logs = [defaultPath(file,logsDir) for file in logs]
+  logsRead = readLogsFiles([file for file in logs if isLogsHTML(file)],csvProcesses)
   for file in logs:
-    myAnimation.loadLogsFromFile(defaultPath(file,logsDir))
+    myAnimation.loadLogsFromFile(file,logsRead.get(file))
 
   if geocacher:
     myAnimation.addGeocacherLogs()
@@ -1365,6 +3069,17 @@ if __name__=='__main__':
   #  print ("Problem in generation:", msg)
 
   print ('That\'s all folks!')
-  print ('Next step : mencoder "mf://map*.png" -mf fps=24 -o Film.avi -ovc lavc -lavcopts vcodec=mpeg4 -vf scale=1280:720')
-  print ('Next step : mencoder "mf://@listPNG.txt" -mf fps=24 -o Film.avi -ovc lavc -lavcopts vcodec=mpeg4 -vf scale=1280:720')
+  if videoFile and videoFile.lower().endswith('.rgb'):
+    print ('Next step : ffmpeg -f rawvideo -pix_fmt rgb24 -s %dx%d -r %d -i %s -c:v libx264 -pix_fmt yuv420p Film.mp4'%(xSize,ySize,videoFps,videoFile))
+  elif videoFile:
+    print ('Next step : ffmpeg -i %s -c:v libx264 -pix_fmt yuv420p Film.mp4'%videoFile)
+    print ('Next step : mencoder %s -o Film.avi -ovc lavc -lavcopts vcodec=mpeg4 -vf scale=1280:720'%videoFile)
+  elif frameFormat != 'png' and len(myAnimation.frameSources) == 0:
+    print ('Next step : ffmpeg -framerate %d -i map%%04d.%s -c:v libx264 -pix_fmt yuv420p Film.mp4'%(videoFps,frameFormat))
+  elif frameFormat != 'png':
+    print ('Next step : encode the frames in the order of listPNG.txt')
+  else:
+    if len(myAnimation.frameSources) == 0:
+      print ('Next step : mencoder "mf://map*.png" -mf fps=24 -o Film.avi -ovc lavc -lavcopts vcodec=mpeg4 -vf scale=1280:720')
+    print ('Next step : mencoder "mf://@listPNG.txt" -mf fps=24 -o Film.avi -ovc lavc -lavcopts vcodec=mpeg4 -vf scale=1280:720')
 